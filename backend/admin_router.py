@@ -0,0 +1,71 @@
+# backend/admin_router.py
+# --------------------------------------------
+# Endpoints de administración (importación masiva)
+# --------------------------------------------
+# Se protegen con el header X-Admin-Token (ver require_admin en backend/security.py).
+import codecs
+from typing import Literal, Optional
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+
+from backend.database import db_connection
+from backend.security import require_admin
+from backend.bulk_import import import_stream, IMPORT_CHUNK_SIZE, IMPORT_MAX_CHUNK_SIZE
+
+router = APIRouter()
+
+
+def _body_lines(request: Request):
+    """
+    Líneas del body para consumir desde un hilo del threadpool: cada trozo se pide
+    al event loop a medida que se necesita, así el archivo nunca está entero en memoria.
+    """
+    chunks = request.stream()
+
+    async def next_chunk():
+        try:
+            return await chunks.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    while True:
+        chunk = anyio.from_thread.run(next_chunk)
+        if chunk is None:
+            break
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+@router.post("/admin/import/appointments", dependencies=[Depends(require_admin)])
+async def import_appointments(
+    request: Request,
+    format: Optional[Literal["ndjson", "csv"]] = Query(None),
+    chunk_size: int = Query(IMPORT_CHUNK_SIZE, ge=1, le=IMPORT_MAX_CHUNK_SIZE),
+):
+    """
+    Importa citas históricas (con nota, prescripciones y órdenes) desde un body NDJSON o CSV.
+    El formato sale de ?format= o del Content-Type (text/csv / application/x-ndjson).
+    Responde con el conteo de filas importadas y los errores por línea.
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if "csv" in content_type else "ndjson"
+
+    def run():
+        try:
+            with db_connection() as conn:
+                return import_stream(conn, _body_lines(request), format, chunk_size)
+        except Exception as e:
+            print("Error en importación:", e)
+            raise HTTPException(status_code=500, detail="Error en la importación")
+
+    return await run_in_threadpool(run)
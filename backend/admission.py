@@ -0,0 +1,145 @@
+# backend/admission.py
+# --------------------------------------------
+# Control de admisión: cupos de requests concurrentes por clase de ruta
+# --------------------------------------------
+# Cada request de la API que toca MySQL cae en una clase (auth, reads, writes) con
+# un máximo de requests en curso, acorde al tamaño del pool. Si el cupo está lleno
+# espera en una cola corta (ADMISSION_WAIT segundos como mucho); si la cola también
+# está llena o se vence el plazo, responde 503 + Retry-After de inmediato en lugar
+# de ocupar un hilo más esperando una conexión.
+import asyncio
+import os
+from collections import deque
+from typing import Optional
+
+from backend.database import DB_POOL_MAX
+from backend.metrics import registry, ADMISSION_ACTIVE, ADMISSION_QUEUE, ADMISSION_REJECTED
+
+ADMISSION_AUTH = int(os.getenv("ADMISSION_AUTH", str(DB_POOL_MAX)))         # 0 = sin límite
+ADMISSION_READS = int(os.getenv("ADMISSION_READS", str(DB_POOL_MAX * 2)))
+ADMISSION_WRITES = int(os.getenv("ADMISSION_WRITES", str(DB_POOL_MAX)))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE", "100"))            # requests en espera por clase
+ADMISSION_WAIT = float(os.getenv("ADMISSION_WAIT", "2"))                    # seg. máximos en la cola
+ADMISSION_RETRY_AFTER = os.getenv("ADMISSION_RETRY_AFTER", "1")
+
+API_PREFIX = "/api/v1"
+AUTH_PATHS = {f"{API_PREFIX}/login", f"{API_PREFIX}/register"}
+# Streams largos que no retienen una conexión a MySQL
+EXEMPT_PATHS = {f"{API_PREFIX}/events"}
+
+
+class AdmissionGate:
+    """Semáforo con cola acotada y plazo; vive en el event loop (sin locks)."""
+
+    def __init__(self, name, limit, max_queue=ADMISSION_QUEUE_SIZE, wait=ADMISSION_WAIT):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.wait = wait
+        self.active = 0
+        self._waiters = deque()
+
+    def depth(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> Optional[str]:
+        """None si se admitió; si no, el motivo del rechazo ('queue_full' o 'timeout')."""
+        if self.limit <= 0 or (self.active < self.limit and not self._waiters):
+            self.active += 1
+            return None
+        if len(self._waiters) >= self.max_queue:
+            return "queue_full"
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await asyncio.wait_for(fut, self.wait)
+            return None  # release() nos cedió su cupo
+        except asyncio.TimeoutError:
+            return "timeout"
+        except asyncio.CancelledError:
+            # El cliente se fue; si ya teníamos el cupo, se devuelve
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+        finally:
+            try:
+                self._waiters.remove(fut)
+            except ValueError:
+                pass
+
+    def release(self):
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)  # el cupo pasa directo al siguiente en la cola
+                return
+        self.active -= 1
+
+
+GATES = {
+    "auth": AdmissionGate("auth", ADMISSION_AUTH),
+    "reads": AdmissionGate("reads", ADMISSION_READS),
+    "writes": AdmissionGate("writes", ADMISSION_WRITES),
+}
+
+def _collect_admission_metrics():
+    for name, gate in GATES.items():
+        ADMISSION_ACTIVE.set((name,), gate.active)
+        ADMISSION_QUEUE.set((name,), gate.depth())
+
+registry.add_collector(_collect_admission_metrics)
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """Clase de admisión del request, o None si no pasa por el control (estáticos, métricas, SSE)."""
+    if not path.startswith(API_PREFIX + "/") or path in EXEMPT_PATHS:
+        return None
+    if path in AUTH_PATHS:
+        return "auth"
+    if method in ("GET", "HEAD"):
+        return "reads"
+    if method == "OPTIONS":
+        return None
+    return "writes"
+
+
+class AdmissionMiddleware:
+    """ASGI puro: aplica los cupos de GATES antes de llegar al router."""
+
+    def __init__(self, app, gates=None):
+        self.app = app
+        self.gates = gates or GATES
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        cls = route_class(scope["method"], scope["path"])
+        gate = self.gates.get(cls) if cls else None
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+
+        reason = await gate.acquire()
+        if reason is not None:
+            ADMISSION_REJECTED.inc((cls, reason))
+            await _reject(send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
+
+
+async def _reject(send):
+    body = '{"detail":"Servidor ocupado, intenta de nuevo en un momento"}'.encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"retry-after", ADMISSION_RETRY_AFTER.encode("ascii")),
+            (b"content-length", str(len(body)).encode("ascii")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,128 @@
+# backend/archive.py
+# --------------------------------------------
+# Archivo de citas cerradas (appointments_archive y tablas hijas *_archive)
+# --------------------------------------------
+# scripts/archive_appointments.py mueve por lotes las citas completadas o
+# canceladas anteriores a un horizonte, junto con su nota, prescripciones y
+# órdenes. Cada lote es una transacción: una cita está en las tablas vivas o en
+# las de archivo, nunca en ambas ni a medias. archive_state guarda la marca
+# "archived_before": ninguna cita con fecha >= marca está archivada, así el
+# historial solo consulta el archivo cuando se pide un rango anterior a ella.
+import os
+import time
+from datetime import datetime
+from typing import Optional
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "730"))   # antigüedad mínima para archivar
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))  # citas por transacción
+
+# Columnas explícitas: las tablas de archivo no dependen del orden de las vivas
+_COLUMNS = {
+    "appointments": "id, patient_id, doctor_id, appointment_date, reason, status, created_at",
+    "consult_notes": "id, appointment_id, note, created_at",
+    "prescriptions": "id, appointment_id, medication_name, dose, route, frequency, duration, quantity, instructions, created_at",
+    "orders": "id, appointment_id, type, name, priority, notes, scheduled_date, created_at",
+}
+_CHILD_TABLES = ("consult_notes", "prescriptions", "orders")
+_CLOSED = ("completed", "cancelled")
+
+
+def archived_before(cur) -> Optional[datetime]:
+    """Marca actual del archivo, o None si nunca se archivó nada."""
+    cur.execute("SELECT archived_before FROM archive_state WHERE id = 1")
+    row = cur.fetchone()
+    if row is None:
+        return None
+    return row["archived_before"] if isinstance(row, dict) else row[0]
+
+
+def history_needs_archive(cur, date_from, date_to, status) -> bool:
+    """
+    El historial incluye el archivo solo si el usuario pidió un rango de fechas
+    que empieza antes de la marca (sin date_from, basta con date_to). Sin rango
+    se responde solo con las tablas vivas.
+    """
+    if status == "scheduled" or (date_from is None and date_to is None):
+        return False
+    mark = archived_before(cur)
+    return mark is not None and (date_from is None or date_from < mark)
+
+
+def advance_mark(conn, cutoff: datetime):
+    """Sube la marca a `cutoff` (nunca la baja). Va antes de mover filas."""
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "INSERT INTO archive_state (id, archived_before) VALUES (1, %s) "
+            "ON DUPLICATE KEY UPDATE archived_before = GREATEST(archived_before, VALUES(archived_before))",
+            (cutoff,),
+        )
+        conn.commit()
+    finally:
+        cur.close()
+
+
+def archive_batch(conn, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE,
+                  status: str = "completed") -> int:
+    """
+    Mueve hasta `batch_size` citas con ese estado anteriores a `cutoff`. Devuelve
+    cuántas movió. Un solo estado por lote: el SELECT ... FOR UPDATE recorre en orden
+    idx_appointments_status_date y bloquea solo las filas que va a mover (con IN
+    habría que ordenar todas las candidatas y se bloquearían todas).
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "SELECT id FROM appointments "
+            "WHERE status = %s AND appointment_date < %s "
+            "ORDER BY appointment_date, id LIMIT %s FOR UPDATE",
+            (status, cutoff, batch_size),
+        )
+        ids = [r[0] for r in cur.fetchall()]
+        if not ids:
+            conn.rollback()
+            return 0
+        marks = ", ".join(["%s"] * len(ids))
+
+        for table in _CHILD_TABLES:
+            cols = _COLUMNS[table]
+            cur.execute(
+                f"INSERT INTO {table}_archive ({cols}) SELECT {cols} FROM {table} WHERE appointment_id IN ({marks})",
+                ids,
+            )
+        cols = _COLUMNS["appointments"]
+        cur.execute(
+            f"INSERT INTO appointments_archive ({cols}) SELECT {cols} FROM appointments WHERE id IN ({marks})",
+            ids,
+        )
+        for table in _CHILD_TABLES:
+            cur.execute(f"DELETE FROM {table} WHERE appointment_id IN ({marks})", ids)
+        cur.execute(f"DELETE FROM appointments WHERE id IN ({marks})", ids)
+        conn.commit()
+        return len(ids)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def archive_closed(conn, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE,
+                   pause: float = 0.0, progress=None) -> int:
+    """
+    Archiva todas las citas cerradas anteriores a `cutoff`, lote por lote.
+    `pause` (segundos entre lotes) deja respirar al primario y a la réplica.
+    """
+    advance_mark(conn, cutoff)
+    total = 0
+    for status in _CLOSED:
+        while True:
+            moved = archive_batch(conn, cutoff, batch_size, status)
+            if not moved:
+                break
+            total += moved
+            if progress:
+                progress(total)
+            if pause:
+                time.sleep(pause)
+    return total
@@ -0,0 +1,129 @@
+# backend/availability.py
+# --------------------------------------------
+# Agenda en memoria por doctor: franjas libres y detección de choques
+# --------------------------------------------
+# Cada doctor tiene una lista ordenada con el inicio de sus citas agendadas
+# (futuras); con bisect, ver si una hora choca o listar franjas libres es O(log n)
+# sin recorrer la tabla appointments. Se carga perezosamente y se actualiza al
+# crear/cancelar/completar. Con varios workers la copia local puede quedar vieja
+# (se recarga cada AVAILABILITY_TTL), por eso create_appointment no la consulta:
+# verifica en MySQL con el doctor y el rango bloqueados (SELECT ... FOR UPDATE).
+import bisect
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+APPOINTMENT_SLOT_MINUTES = int(os.getenv("APPOINTMENT_SLOT_MINUTES", "30"))
+AVAILABILITY_DAY_START = os.getenv("AVAILABILITY_DAY_START", "08:00")
+AVAILABILITY_DAY_END = os.getenv("AVAILABILITY_DAY_END", "17:00")
+AVAILABILITY_MAX_DAYS = int(os.getenv("AVAILABILITY_MAX_DAYS", "31"))
+AVAILABILITY_TTL = float(os.getenv("AVAILABILITY_TTL", "60"))  # segundos
+
+SLOT = timedelta(minutes=APPOINTMENT_SLOT_MINUTES)
+
+
+def _clock(value: str):
+    h, m = value.split(":")
+    return timedelta(hours=int(h), minutes=int(m))
+
+
+class DoctorSchedule:
+    """Inicios de citas agendadas de un doctor, ordenados."""
+
+    def __init__(self, rows):
+        pairs = sorted((start, appt_id) for appt_id, start in rows)
+        self.starts = [p[0] for p in pairs]
+        self.ids = [p[1] for p in pairs]
+        self.by_id = {appt_id: start for start, appt_id in pairs}
+        self.loaded_at = time.monotonic()
+
+    def conflict(self, start: datetime):
+        """Id de una cita que se cruza con [start, start + SLOT), o None."""
+        i = bisect.bisect_right(self.starts, start - SLOT)
+        if i < len(self.starts) and self.starts[i] < start + SLOT:
+            return self.ids[i]
+        return None
+
+    def add(self, appt_id: int, start: datetime):
+        if appt_id in self.by_id:
+            return
+        i = bisect.bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ids.insert(i, appt_id)
+        self.by_id[appt_id] = start
+
+    def remove(self, appt_id: int):
+        start = self.by_id.pop(appt_id, None)
+        if start is None:
+            return
+        i = bisect.bisect_left(self.starts, start)
+        while self.ids[i] != appt_id:
+            i += 1
+        del self.starts[i]
+        del self.ids[i]
+
+
+class AvailabilityIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._schedules = {}
+
+    def _load(self, cur, doctor_id: int) -> DoctorSchedule:
+        # Solo interesan las citas que aún pueden chocar (desde una franja atrás)
+        cur.execute(
+            "SELECT id, appointment_date FROM appointments "
+            "WHERE doctor_id=%s AND status='scheduled' AND appointment_date > %s",
+            (doctor_id, datetime.now() - SLOT),
+        )
+        rows = cur.fetchall()
+        if rows and isinstance(rows[0], dict):
+            rows = [(r["id"], r["appointment_date"]) for r in rows]
+        return DoctorSchedule(rows)
+
+    def schedule(self, cur, doctor_id: int) -> DoctorSchedule:
+        with self._lock:
+            sched = self._schedules.get(doctor_id)
+            if sched is not None and time.monotonic() - sched.loaded_at < AVAILABILITY_TTL:
+                return sched
+        sched = self._load(cur, doctor_id)
+        with self._lock:
+            self._schedules[doctor_id] = sched
+        return sched
+
+    def conflict(self, cur, doctor_id: int, start: datetime):
+        sched = self.schedule(cur, doctor_id)
+        with self._lock:
+            return sched.conflict(start)
+
+    def add(self, doctor_id: int, appt_id: int, start: datetime):
+        with self._lock:
+            sched = self._schedules.get(doctor_id)
+            if sched is not None:
+                sched.add(appt_id, start)
+
+    def remove(self, doctor_id: int, appt_id: int):
+        with self._lock:
+            sched = self._schedules.get(doctor_id)
+            if sched is not None:
+                sched.remove(appt_id)
+
+    def free_slots(self, cur, doctor_id: int, day_from: datetime, day_to: datetime):
+        """Franjas libres entre day_from y day_to (inclusive), dentro del horario laboral."""
+        sched = self.schedule(cur, doctor_id)
+        day_start, day_end = _clock(AVAILABILITY_DAY_START), _clock(AVAILABILITY_DAY_END)
+        now = datetime.now()
+        slots = []
+        with self._lock:
+            day = day_from
+            while day <= day_to:
+                t = day + day_start
+                while t + SLOT <= day + day_end:
+                    if t >= now and sched.conflict(t) is None:
+                        slots.append(t)
+                    t += SLOT
+                day += timedelta(days=1)
+        return slots
+
+
+availability = AvailabilityIndex()
@@ -0,0 +1,244 @@
+# backend/bulk_import.py
+# --------------------------------------------
+# Importación masiva de citas históricas (NDJSON o CSV)
+# --------------------------------------------
+# Lo usan el endpoint POST /admin/import/appointments y scripts/import_data.py.
+# Lee las líneas de forma perezosa, valida cada fila con los modelos Pydantic de
+# los routers y escribe por lotes de `chunk_size` filas en una sola transacción,
+# así la memoria no depende del tamaño del archivo. Una fila inválida se reporta
+# sin abortar la carga.
+import csv
+from datetime import datetime
+from typing import List, Literal, Optional
+
+from pydantic import ValidationError
+
+from backend.doctor_stats import StatsDelta
+from backend.serialization import loads
+from backend.user_router import AppointmentCreate
+from backend.medical_router import PrescriptionIn, OrderIn
+
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_MAX_CHUNK_SIZE = 10000
+IMPORT_INSERT_ROWS = 1000         # filas por INSERT multi-fila (acota el tamaño del paquete)
+IMPORT_MAX_ERRORS = 1000          # errores detallados en el reporte (el conteo sigue)
+# Columnas CSV: patient_id, doctor_id, appointment_date, reason, status, notes,
+# prescriptions, orders (las dos últimas como arreglos JSON dentro de la celda)
+
+
+class ImportedAppointment(AppointmentCreate):
+    """Fila de importación: una cita con su nota, prescripciones y órdenes."""
+    patient_id: int
+    status: Literal["scheduled", "completed", "cancelled"] = "completed"
+    notes: Optional[str] = None
+    prescriptions: List[PrescriptionIn] = []
+    orders: List[OrderIn] = []
+
+
+class ImportReport:
+    def __init__(self):
+        self.processed = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line: int, message: str):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def as_dict(self):
+        return {
+            "processed": self.processed,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+def _parse_datetime(value: str) -> datetime:
+    iso = value.replace("T", " ")
+    if len(iso) == 16:
+        iso += ":00"
+    return datetime.strptime(iso, "%Y-%m-%d %H:%M:%S")
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+
+def iter_records(lines, fmt: str):
+    """(número de línea, dict | Exception) por cada registro del flujo de líneas."""
+    if fmt == "ndjson":
+        for n, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield n, loads(line)
+            except ValueError as e:
+                yield n, e
+        return
+
+    reader = csv.DictReader(lines)
+    for row in reader:
+        n = reader.line_num
+        try:
+            record = {k: v for k, v in row.items() if k is not None and v != ""}
+            for key in ("prescriptions", "orders"):
+                if key in record:
+                    record[key] = loads(record[key])
+            yield n, record
+        except ValueError as e:
+            yield n, e
+
+def _validate(n, raw, report):
+    if isinstance(raw, Exception):
+        report.error(n, f"Registro ilegible: {raw}")
+        return None
+    try:
+        item = ImportedAppointment.model_validate(raw)
+        return n, item, _parse_datetime(item.appointment_date)
+    except ValidationError as e:
+        report.error(n, _validation_message(e))
+    except ValueError:
+        report.error(n, "appointment_date: formato de fecha/hora inválido")
+    return None
+
+def _check_users(cur, rows, report):
+    """Descarta filas cuyo paciente/doctor no existe o no tiene ese rol (una consulta por lote)."""
+    ids = {r[1].patient_id for r in rows} | {r[1].doctor_id for r in rows}
+    if not ids:
+        return rows
+    marks = ",".join(["%s"] * len(ids))
+    cur.execute(f"SELECT id, role FROM users WHERE id IN ({marks})", tuple(ids))
+    roles = dict(cur.fetchall())
+    valid = []
+    for n, item, dt in rows:
+        if roles.get(item.patient_id) != "patient":
+            report.error(n, f"patient_id {item.patient_id} no es un paciente")
+        elif roles.get(item.doctor_id) != "doctor":
+            report.error(n, f"doctor_id {item.doctor_id} no es un doctor")
+        else:
+            valid.append((n, item, dt))
+    return valid
+
+def _consecutive_ids(conn) -> bool:
+    """
+    True si un INSERT multi-fila recibe ids AUTO_INCREMENT consecutivos
+    (innodb_autoinc_lock_mode 0 o 1): el primero es LAST_INSERT_ID() y el resto
+    se deduce por posición. Con el modo 2 (interleaved) no está garantizado.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT @@innodb_autoinc_lock_mode")
+        row = cur.fetchone()
+        return row is not None and row[0] is not None and int(row[0]) <= 1
+    except Exception:
+        return False
+    finally:
+        cur.close()
+
+def _insert_appointments(cur, rows, consecutive: bool):
+    """Ids de las citas insertadas, en el orden de `rows`."""
+    if not consecutive:
+        ids = []
+        for _, item, dt in rows:
+            cur.execute(
+                "INSERT INTO appointments (patient_id, doctor_id, appointment_date, reason, status) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                (item.patient_id, item.doctor_id, dt, item.reason, item.status),
+            )
+            ids.append(cur.lastrowid)
+        return ids
+    ids = []
+    for start in range(0, len(rows), IMPORT_INSERT_ROWS):
+        part = rows[start:start + IMPORT_INSERT_ROWS]
+        params = []
+        for _, item, dt in part:
+            params.extend((item.patient_id, item.doctor_id, dt, item.reason, item.status))
+        cur.execute(
+            "INSERT INTO appointments (patient_id, doctor_id, appointment_date, reason, status) VALUES "
+            + ", ".join(["(%s, %s, %s, %s, %s)"] * len(part)),
+            params,
+        )
+        first = cur.lastrowid  # LAST_INSERT_ID(): id de la primera fila del INSERT
+        ids.extend(range(first, first + len(part)))
+    return ids
+
+def _write(cur, rows, consecutive: bool = False):
+    """Inserta las citas (multi-fila si los ids son consecutivos), los hijos en lotes multi-fila y sus estadísticas."""
+    notes, prescriptions, orders = [], [], []
+    stats = StatsDelta()
+    for appt_id, (_, item, dt) in zip(_insert_appointments(cur, rows, consecutive), rows):
+        if item.notes:
+            notes.append((appt_id, item.notes))
+        prescriptions.extend(
+            (appt_id, p.medication_name, p.dose, p.route, p.frequency, p.duration, p.quantity, p.instructions)
+            for p in item.prescriptions
+        )
+        orders.extend(
+            (appt_id, o.type, o.name, o.priority or "normal", o.notes, o.scheduled_date)
+            for o in item.orders
+        )
+        stats.status(item.doctor_id, dt.date(), None, item.status)
+        stats.add_orders(item.doctor_id, dt.date(), item.orders)
+        stats.add_prescriptions(item.doctor_id, dt.date(), item.prescriptions)
+    if notes:
+        cur.executemany("INSERT INTO consult_notes (appointment_id, note) VALUES (%s, %s)", notes)
+    if prescriptions:
+        cur.executemany(
+            "INSERT INTO prescriptions (appointment_id, medication_name, dose, route, frequency, duration, "
+            "quantity, instructions) VALUES (%s,%s,%s,%s,%s,%s,%s,%s)", prescriptions)
+    if orders:
+        cur.executemany(
+            "INSERT INTO orders (appointment_id, type, name, priority, notes, scheduled_date) "
+            "VALUES (%s,%s,%s,%s,%s,%s)", orders)
+    stats.apply(cur)
+
+def _flush(conn, rows, report, consecutive=False):
+    if not rows:
+        return
+    cur = conn.cursor()
+    try:
+        rows = _check_users(cur, rows, report)
+        if not rows:
+            return
+        try:
+            _write(cur, rows, consecutive)
+            conn.commit()
+            report.imported += len(rows)
+            return
+        except Exception:
+            conn.rollback()
+        # Falló el lote: se reintenta fila por fila para aislar las que fallan
+        for row in rows:
+            try:
+                _write(cur, [row])
+                conn.commit()
+                report.imported += 1
+            except Exception as e:
+                conn.rollback()
+                report.error(row[0], f"Error de base de datos: {e}")
+    finally:
+        cur.close()
+
+def import_stream(conn, lines, fmt: str = "ndjson", chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """
+    Importa todas las filas de `lines` (iterable de str) usando la conexión dada.
+    Devuelve el reporte: procesadas, importadas, fallidas y detalle de errores.
+    """
+    if fmt not in ("ndjson", "csv"):
+        raise ValueError("Formato no soportado (usa ndjson o csv)")
+    chunk_size = max(1, min(chunk_size, IMPORT_MAX_CHUNK_SIZE))
+    report = ImportReport()
+    consecutive = _consecutive_ids(conn)
+    batch = []
+    for n, raw in iter_records(lines, fmt):
+        report.processed += 1
+        row = _validate(n, raw, report)
+        if row:
+            batch.append(row)
+        if len(batch) >= chunk_size:
+            _flush(conn, batch, report, consecutive)
+            batch = []
+    _flush(conn, batch, report, consecutive)
+    return report.as_dict()
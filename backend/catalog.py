@@ -0,0 +1,240 @@
+# backend/catalog.py
+# --------------------------------------------
+# Autocompletado de medicamentos y órdenes (índice de prefijos en memoria)
+# --------------------------------------------
+# Los nombres salen de db/catalog.json y de los ya usados en MySQL (con cuántas
+# veces se usaron). Cada nombre se normaliza (minúsculas, sin tildes) y se guarda
+# una clave por palabra en una lista ordenada: un prefijo es un rango que se
+# encuentra con bisect, así "clav" también sugiere "Amoxicilina con ácido
+# clavulánico". Las sugerencias van por frecuencia de uso. Se carga perezosamente,
+# complete_appointment suma los nombres nuevos al momento y, como en la agenda,
+# se recarga cada CATALOG_TTL para ver lo que escribieron otros workers (un solo
+# hilo recarga; mientras tanto los demás responden con el índice anterior).
+import bisect
+import heapq
+import os
+import threading
+import time
+import unicodedata
+from pathlib import Path
+
+from backend.database import db_connection
+from backend.serialization import loads
+
+CATALOG_PATH = Path(os.getenv("CATALOG_PATH", Path(__file__).resolve().parent.parent / "db" / "catalog.json"))
+CATALOG_TTL = float(os.getenv("CATALOG_TTL", "600"))      # segundos
+CATALOG_MAX_NAMES = 50000                                 # nombres por lista leídos de MySQL
+CATALOG_LIMIT = 10
+CATALOG_MAX_LIMIT = 25
+
+ORDER_TYPES = ("lab", "imaging", "procedure", "referral")
+
+
+def normalize(text: str) -> str:
+    """'  Ácido  Fólico ' -> 'acido folico'."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.split())
+
+
+class PrefixIndex:
+    """
+    Nombres con su frecuencia. `keys` tiene (texto normalizado desde cada palabra, id)
+    ordenado; `ranked` tiene los ids de más a menos usados. Un prefijo con pocas
+    claves se resuelve recorriendo su rango; uno muy amplio ("a", "me") recorriendo
+    `ranked` hasta juntar `limit` coincidencias, que aparecen enseguida.
+    """
+
+    def __init__(self, items=()):
+        self.keys = []
+        self.names = []     # id -> nombre como se muestra
+        self.norms = []     # id -> nombre normalizado
+        self.counts = []    # id -> veces usado
+        self.by_norm = {}   # nombre normalizado -> id
+        self.ranked = []    # (-veces, largo, nombre, id) ordenado
+        for name, count in items:
+            self._add(name, count, build=True)
+        self.keys.sort()
+        self.ranked = sorted(self._rank(i) for i in range(len(self.names)))
+
+    def _rank(self, i):
+        return (-self.counts[i], len(self.names[i]), self.names[i], i)
+
+    def _add(self, name: str, count: int, build: bool = False):
+        name = " ".join(name.split())
+        norm = normalize(name)
+        if not norm:
+            return
+        i = self.by_norm.get(norm)
+        if i is not None:
+            if build:
+                self.counts[i] += count
+                return
+            # Mover el id a su nuevo lugar en `ranked` (borrar + insertar, sin reordenar todo)
+            del self.ranked[bisect.bisect_left(self.ranked, self._rank(i))]
+            self.counts[i] += count
+            bisect.insort(self.ranked, self._rank(i))
+            return
+        i = len(self.names)
+        self.names.append(name)
+        self.norms.append(norm)
+        self.counts.append(count)
+        self.by_norm[norm] = i
+        words = norm.split(" ")
+        for w in range(len(words)):
+            key = (" ".join(words[w:]), i)
+            if build:
+                self.keys.append(key)
+            else:
+                bisect.insort(self.keys, key)
+        if not build:
+            bisect.insort(self.ranked, self._rank(i))
+
+    def add(self, name: str, count: int = 1):
+        self._add(name, count)
+
+    def search(self, prefix: str, limit: int = CATALOG_LIMIT):
+        prefix = normalize(prefix)
+        lo = bisect.bisect_left(self.keys, (prefix,))
+        hi = bisect.bisect_left(self.keys, (prefix + "\uffff",), lo)
+        matches = hi - lo
+        if not matches:
+            return []
+        # Costo estimado de recorrer `ranked`: ~limit * total / coincidencias
+        if matches * matches <= limit * len(self.ranked):
+            ids = {i for _, i in self.keys[lo:hi]}
+            best = [r[3] for r in heapq.nsmallest(limit, (self._rank(i) for i in ids))]
+        else:
+            best = []
+            inner = " " + prefix
+            for r in self.ranked:
+                norm = self.norms[r[3]]
+                if norm.startswith(prefix) or inner in norm:
+                    best.append(r[3])
+                    if len(best) == limit:
+                        break
+        return [{"name": self.names[i], "count": self.counts[i]} for i in best]
+
+
+def _read_file():
+    try:
+        data = loads(CATALOG_PATH.read_bytes())
+    except FileNotFoundError:
+        return [], {}
+    return data.get("medications", []), data.get("orders", {})
+
+
+class Catalog:
+    def __init__(self):
+        # _lock protege los índices y nunca se retiene durante la consulta a MySQL.
+        # Al vencer el TTL recarga un solo hilo (_loading) y los demás siguen
+        # respondiendo con el índice anterior; solo la primera carga hace esperar
+        # (en _load_lock) porque todavía no hay nada que servir.
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._medications = None
+        self._orders = {}
+        self._loaded_at = 0.0
+        self._loading = False
+        self._recorded = []     # (prescripciones, órdenes) sumadas durante la recarga en curso
+
+    def _load(self, cur):
+        medications, orders = _read_file()
+        # Frecuencias: medicamentos desde la tabla resumen de estadísticas (incluye el archivo)
+        cur.execute(
+            "SELECT medication_name, SUM(total) AS n FROM doctor_medication_stats "
+            "GROUP BY medication_name ORDER BY n DESC LIMIT %s",
+            (CATALOG_MAX_NAMES,),
+        )
+        used_meds = [(r[0], int(r[1])) if not isinstance(r, dict) else (r["medication_name"], int(r["n"]))
+                     for r in cur.fetchall()]
+        cur.execute(
+            "SELECT type, name, COUNT(*) AS n FROM orders GROUP BY type, name ORDER BY n DESC LIMIT %s",
+            (CATALOG_MAX_NAMES,),
+        )
+        used_orders = {t: [] for t in ORDER_TYPES}
+        for r in cur.fetchall():
+            t, name, n = (r["type"], r["name"], r["n"]) if isinstance(r, dict) else r
+            used_orders.setdefault(t, []).append((name, int(n)))
+
+        meds = PrefixIndex([(n, 0) for n in medications] + used_meds)
+        order_index = {
+            t: PrefixIndex([(n, 0) for n in orders.get(t, [])] + used_orders.get(t, []))
+            for t in ORDER_TYPES
+        }
+        return meds, order_index
+
+    @staticmethod
+    def _add(meds, order_index, prescriptions, orders):
+        for p in prescriptions:
+            meds.add(p.medication_name)
+        for o in orders:
+            order_index[o.type].add(o.name)
+
+    def _ensure(self):
+        """Solo toca MySQL si el índice no está cargado o venció; si no, responde desde memoria."""
+        with self._lock:
+            if self._medications is not None:
+                if self._loading or time.monotonic() - self._loaded_at < CATALOG_TTL:
+                    return  # vigente, u otro hilo ya lo está recargando: se usa el anterior
+                self._loading = True
+                self._recorded = []
+                refresh = True
+            else:
+                refresh = False
+        if refresh:
+            self._reload()
+            return
+        with self._load_lock:
+            with self._lock:
+                if self._medications is not None:
+                    return
+                self._loading = True
+                self._recorded = []
+            self._reload()
+
+    def _reload(self):
+        try:
+            with db_connection(read=True) as conn:
+                cur = conn.cursor()
+                try:
+                    meds, orders = self._load(cur)
+                finally:
+                    cur.close()
+        except Exception:
+            with self._lock:
+                self._loading = False
+                self._recorded = []
+            raise
+        with self._lock:
+            # Lo que se escribió durante la consulta puede no estar en ella: se vuelve a sumar
+            for prescriptions, new_orders in self._recorded:
+                self._add(meds, orders, prescriptions, new_orders)
+            self._medications, self._orders = meds, orders
+            self._loaded_at = time.monotonic()
+            self._loading = False
+            self._recorded = []
+
+    def medications(self, q: str, limit: int = CATALOG_LIMIT):
+        self._ensure()
+        with self._lock:
+            return self._medications.search(q, limit)
+
+    def orders(self, type: str, q: str, limit: int = CATALOG_LIMIT):
+        self._ensure()
+        with self._lock:
+            return self._orders[type].search(q, limit)
+
+    def record(self, prescriptions=(), orders=()):
+        """
+        Suma los nombres recién escritos (después del commit). Si hay una carga en
+        curso también se anotan para sumarlos al índice nuevo; sin cargar, no hace nada más.
+        """
+        with self._lock:
+            if self._loading:
+                self._recorded.append((list(prescriptions), list(orders)))
+            if self._medications is not None:
+                self._add(self._medications, self._orders, prescriptions, orders)
+
+
+catalog = Catalog()
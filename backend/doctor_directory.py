@@ -0,0 +1,112 @@
+# backend/doctor_directory.py
+# --------------------------------------------
+# Directorio de doctores en memoria para GET /doctors
+# --------------------------------------------
+# La lista de doctores solo cambia cuando alguien se registra como doctor, así que
+# se guarda ya serializada (con su ETag) y se invalida desde register_user.
+# Con varios workers cada uno tiene su copia: el TTL acota cuánto puede quedar vieja.
+import hashlib
+import os
+import threading
+import time
+
+from backend.database import get_db_connection
+from backend.serialization import dumps
+
+DOCTORS_CACHE_TTL = float(os.getenv("DOCTORS_CACHE_TTL", "300"))  # segundos
+
+
+def _norm(specialty: str) -> str:
+    return " ".join(specialty.split()).casefold()
+
+def _load_doctors():
+    # Réplica salvo que alguien se haya registrado como doctor hace un momento
+    conn = get_db_connection(read=True, sticky_key="doctors")
+    if not conn:
+        raise RuntimeError("Error de conexión a la base de datos")
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute("SELECT id AS user_id, full_name, email, specialty FROM users WHERE role='doctor'")
+        return cur.fetchall()
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+        conn.close()
+
+
+class DoctorDirectory:
+    """Cache del listado de doctores: cuerpo JSON pre-serializado + ETag fuerte, con índice por especialidad."""
+
+    def __init__(self, loader=_load_doctors, ttl: float = DOCTORS_CACHE_TTL):
+        self._loader = loader
+        self.ttl = ttl
+        # _lock solo protege el estado en memoria y nunca se retiene durante la consulta
+        # a MySQL: invalidate() lo toma desde el event loop. _load_lock hace que recargue
+        # un solo hilo del threadpool a la vez.
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._expires_at = 0.0
+        self._version = 0          # se incrementa en cada invalidate()
+        self._doctors = []
+        self._by_specialty = {}
+        self._bodies = {}          # clave (None | especialidad normalizada) -> (body, etag)
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._expires_at = 0.0
+            self._bodies = {}
+
+    def cached(self, specialty=None):
+        """(body, etag) si está en memoria y vigente; None si hay que recargar."""
+        with self._lock:
+            if time.monotonic() >= self._expires_at:
+                return None
+            hit = self._bodies.get(self._key(specialty))
+        return hit or self._render(specialty)
+
+    def get(self, specialty=None):
+        """(body, etag), recargando desde MySQL si hace falta (bloqueante: llamar en threadpool)."""
+        hit = self.cached(specialty)
+        if hit is not None:
+            return hit
+        with self._load_lock:
+            with self._lock:
+                fresh = time.monotonic() < self._expires_at
+                version = self._version
+            if not fresh:
+                doctors = self._loader()
+                by_specialty = {}
+                for d in doctors:
+                    if d.get("specialty"):
+                        by_specialty.setdefault(_norm(d["specialty"]), []).append(d)
+                with self._lock:
+                    # Si alguien invalidó mientras se consultaba, esta carga puede no incluir
+                    # al doctor nuevo: se sirve pero sin marcarla como vigente.
+                    self._doctors, self._by_specialty, self._bodies = doctors, by_specialty, {}
+                    if version == self._version:
+                        self._expires_at = time.monotonic() + self.ttl
+        return self._render(specialty)
+
+    @staticmethod
+    def _key(specialty):
+        return _norm(specialty) if specialty else None
+
+    def _render(self, specialty):
+        key = self._key(specialty)
+        with self._lock:
+            bodies = self._bodies
+            doctors = self._doctors if key is None else self._by_specialty.get(key, [])
+            known = key is None or key in self._by_specialty
+        body = dumps({"doctors": doctors})
+        entry = (body, '"%s"' % hashlib.sha256(body).hexdigest()[:32])
+        if known:  # no cachear especialidades inexistentes
+            with self._lock:
+                if self._bodies is bodies:  # no guardar en un cache que ya se invalidó
+                    bodies[key] = entry
+        return entry
+
+
+doctor_directory = DoctorDirectory()
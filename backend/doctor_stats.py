@@ -0,0 +1,154 @@
+# backend/doctor_stats.py
+# --------------------------------------------
+# Estadísticas por doctor mantenidas de forma incremental
+# --------------------------------------------
+# GET /doctors/{id}/stats lee tres tablas resumen por doctor y día de la cita
+# (citas por estado, órdenes por tipo/prioridad y medicamentos recetados) en
+# lugar de hacer GROUP BY sobre todo el historial: el rango pedido se aplica
+# a las tres. Los handlers que escriben citas acumulan los cambios
+# en un StatsDelta y lo aplican con upserts ANTES del commit, en la misma
+# transacción: si la escritura se revierte, las estadísticas también.
+# scripts/rebuild_doctor_stats.py las recalcula desde cero (tablas vivas + archivo).
+from collections import Counter
+from datetime import date
+from typing import Optional
+
+STATS_MAX_DAYS = 366         # rango máximo de días por consulta
+STATS_DEFAULT_DAYS = 30
+STATS_TOP_MEDICATIONS = 10
+
+_STATUSES = ("scheduled", "completed", "cancelled")
+
+
+class StatsDelta:
+    """Cambios pendientes de aplicar a las tablas resumen (uno por transacción)."""
+
+    def __init__(self):
+        self.days = Counter()          # (doctor_id, day, status) -> delta
+        self.orders = Counter()        # (doctor_id, day, type, priority) -> delta
+        self.medications = Counter()   # (doctor_id, day, medication_name) -> delta
+
+    def status(self, doctor_id: int, day: date, old: Optional[str], new: Optional[str]):
+        """Una cita de ese día pasa de `old` a `new` (None = no existía / ya no cuenta)."""
+        if old == new:
+            return
+        if old:
+            self.days[(doctor_id, day, old)] -= 1
+        if new:
+            self.days[(doctor_id, day, new)] += 1
+
+    def add_orders(self, doctor_id: int, day: date, orders):
+        for o in orders:
+            self.orders[(doctor_id, day, o.type, o.priority or "normal")] += 1
+
+    def add_prescriptions(self, doctor_id: int, day: date, prescriptions):
+        for p in prescriptions:
+            self.medications[(doctor_id, day, p.medication_name)] += 1
+
+    def apply(self, cur):
+        """Upserts multi-fila; se llama antes del commit de la transacción que hizo los cambios."""
+        per_day = {}
+        for (doctor_id, day, status), delta in self.days.items():
+            if delta:
+                row = per_day.setdefault((doctor_id, day), dict.fromkeys(_STATUSES, 0))
+                row[status] += delta
+        if per_day:
+            cur.executemany(
+                "INSERT INTO doctor_daily_stats (doctor_id, day, scheduled, completed, cancelled) "
+                "VALUES (%s, %s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE scheduled = scheduled + VALUES(scheduled), "
+                "completed = completed + VALUES(completed), cancelled = cancelled + VALUES(cancelled)",
+                [(d, day, r["scheduled"], r["completed"], r["cancelled"]) for (d, day), r in per_day.items()],
+            )
+        if self.orders:
+            cur.executemany(
+                "INSERT INTO doctor_order_stats (doctor_id, day, type, priority, total) VALUES (%s, %s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE total = total + VALUES(total)",
+                [k + (n,) for k, n in self.orders.items()],
+            )
+        if self.medications:
+            cur.executemany(
+                "INSERT INTO doctor_medication_stats (doctor_id, day, medication_name, total) VALUES (%s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE total = total + VALUES(total)",
+                [k + (n,) for k, n in self.medications.items()],
+            )
+
+
+def read_stats(cur, doctor_id: int, day_from: date, day_to: date, top: int = STATS_TOP_MEDICATIONS) -> dict:
+    """Estadísticas del doctor entre day_from y day_to (inclusive); cur con dictionary=True."""
+    cur.execute(
+        "SELECT day, scheduled, completed, cancelled FROM doctor_daily_stats "
+        "WHERE doctor_id = %s AND day BETWEEN %s AND %s ORDER BY day",
+        (doctor_id, day_from, day_to),
+    )
+    days = [r for r in cur.fetchall() if r["scheduled"] or r["completed"] or r["cancelled"]]
+    totals = {s: sum(int(r[s]) for r in days) for s in _STATUSES}
+    cur.execute(
+        "SELECT type, priority, SUM(total) AS total FROM doctor_order_stats "
+        "WHERE doctor_id = %s AND day BETWEEN %s AND %s "
+        "GROUP BY type, priority HAVING total > 0 ORDER BY type, priority",
+        (doctor_id, day_from, day_to),
+    )
+    orders = [{**r, "total": int(r["total"])} for r in cur.fetchall()]
+    cur.execute(
+        "SELECT medication_name, SUM(total) AS total FROM doctor_medication_stats "
+        "WHERE doctor_id = %s AND day BETWEEN %s AND %s "
+        "GROUP BY medication_name HAVING total > 0 ORDER BY total DESC, medication_name LIMIT %s",
+        (doctor_id, day_from, day_to, top),
+    )
+    medications = [{**r, "total": int(r["total"])} for r in cur.fetchall()]
+    return {
+        "doctor_id": doctor_id,
+        "from": day_from,
+        "to": day_to,
+        "totals": totals,
+        "days": days,
+        "orders": orders,
+        "top_medications": medications,
+    }
+
+
+# ----- reconstrucción (scripts/rebuild_doctor_stats.py) -----
+# Las hijas archivadas se mueven junto con su cita, así que cada par
+# (vivas, *_archive) se une por separado y luego se agrupa sobre la unión.
+def _both(select: str) -> str:
+    live = select.format(suffix="")
+    return f"({live} UNION ALL {select.format(suffix='_archive')})"
+
+_REBUILD = (
+    ("doctor_daily_stats",
+     "INSERT INTO doctor_daily_stats (doctor_id, day, scheduled, completed, cancelled) "
+     "SELECT doctor_id, DATE(appointment_date), SUM(status = 'scheduled'), "
+     "SUM(status = 'completed'), SUM(status = 'cancelled') FROM "
+     + _both("SELECT a.doctor_id, a.appointment_date, a.status FROM appointments{suffix} a {{where}}")
+     + " x GROUP BY doctor_id, DATE(appointment_date)"),
+    ("doctor_order_stats",
+     "INSERT INTO doctor_order_stats (doctor_id, day, type, priority, total) "
+     "SELECT doctor_id, DATE(appointment_date), type, priority, COUNT(*) FROM "
+     + _both("SELECT a.doctor_id, a.appointment_date, o.type, o.priority FROM orders{suffix} o "
+             "JOIN appointments{suffix} a ON a.id = o.appointment_id {{where}}")
+     + " x GROUP BY doctor_id, DATE(appointment_date), type, priority"),
+    ("doctor_medication_stats",
+     "INSERT INTO doctor_medication_stats (doctor_id, day, medication_name, total) "
+     "SELECT doctor_id, DATE(appointment_date), medication_name, COUNT(*) FROM "
+     + _both("SELECT a.doctor_id, a.appointment_date, p.medication_name FROM prescriptions{suffix} p "
+             "JOIN appointments{suffix} a ON a.id = p.appointment_id {{where}}")
+     + " x GROUP BY doctor_id, DATE(appointment_date), medication_name"),
+)
+
+
+def rebuild(conn, doctor_id: Optional[int] = None):
+    """Recalcula las tablas resumen (de un doctor o de todos) en una sola transacción."""
+    where = "WHERE a.doctor_id = %s" if doctor_id is not None else ""
+    params = (doctor_id,) if doctor_id is not None else ()
+    cur = conn.cursor()
+    try:
+        for table, insert in _REBUILD:
+            cur.execute(f"DELETE FROM {table} " + ("WHERE doctor_id = %s" if doctor_id is not None else ""), params)
+            cur.execute(insert.format(where=where), params * 2)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
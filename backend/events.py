@@ -0,0 +1,217 @@
+# backend/events.py
+# --------------------------------------------
+# Eventos de citas en vivo (Server-Sent Events)
+# --------------------------------------------
+# Los handlers (que corren en el threadpool) publican con event_hub.publish();
+# el hub reparte en el event loop a las conexiones SSE abiertas de cada usuario
+# y guarda los últimos eventos por usuario para reanudar con Last-Event-ID.
+# El transporte entre publicadores y hub es un "broker" intercambiable: el de
+# por defecto es en proceso. Con varios workers en la misma máquina, EVENTS_BROKER_DIR
+# activa UnixSocketBroker, que reenvía cada mensaje a todos (cada worker tiene su
+# propio hub); entre máquinas hay que registrar otro con set_broker().
+import asyncio
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+
+from backend.serialization import dumps, loads
+
+EVENTS_BUFFER = int(os.getenv("EVENTS_BUFFER", "50"))              # eventos guardados por usuario
+EVENTS_MAX_USERS = int(os.getenv("EVENTS_MAX_USERS", "10000"))     # usuarios con buffer en memoria
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))      # segundos entre comentarios "ping"
+EVENTS_QUEUE_SIZE = 100                                            # eventos pendientes por conexión
+EVENTS_BROKER_DIR = os.getenv("EVENTS_BROKER_DIR", "")             # sockets entre workers (vacío = en proceso)
+EVENTS_MAX_MESSAGE = 65536                                         # bytes por mensaje entre workers
+
+# Los ids llevan el arranque del proceso: un Last-Event-ID de otro arranque fuerza un resync
+_BOOT = format(int(time.time() * 1000), "x")
+
+
+class Event:
+    __slots__ = ("id", "seq", "type", "data")
+
+    def __init__(self, seq, type, data):
+        self.seq = seq
+        self.id = f"{_BOOT}-{seq}"
+        self.type = type
+        self.data = data
+
+
+# Marca para pedirle al cliente que recargue (se perdieron eventos)
+RESYNC = Event(0, "resync", {})
+
+
+class _UserBuffer:
+    __slots__ = ("events", "dropped_seq")
+
+    def __init__(self):
+        self.events = deque(maxlen=EVENTS_BUFFER)
+        self.dropped_seq = 0  # seq del último evento que ya salió del buffer
+
+    def append(self, event):
+        if len(self.events) == self.events.maxlen:
+            self.dropped_seq = self.events[0].seq
+        self.events.append(event)
+
+    def last_seq(self):
+        return self.events[-1].seq if self.events else 0
+
+
+class InProcessBroker:
+    """Broker por defecto: entrega directa a los hubs suscritos del mismo proceso."""
+
+    def __init__(self):
+        self._handlers = []
+
+    def subscribe(self, handler):
+        self._handlers.append(handler)
+
+    def publish(self, message):
+        for handler in self._handlers:
+            handler(message)
+
+
+class UnixSocketBroker:
+    """
+    Broker entre workers de la misma máquina. Cada proceso abre un socket Unix de
+    datagramas en `directory`; publicar es enviar el mensaje a todos los sockets
+    del directorio (incluido el propio) y un hilo de cada proceso los recibe.
+    El socket de un worker que ya terminó se borra al fallar el envío.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / f"{os.getpid()}-{_BOOT}.sock"
+        self._handlers = []
+        self._inbox = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._inbox.bind(str(self.path))
+        # Envío sin bloquear: un worker colgado no debe frenar a los handlers
+        self._outbox = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._outbox.setblocking(False)
+        threading.Thread(target=self._listen, name="events-broker", daemon=True).start()
+
+    def subscribe(self, handler):
+        self._handlers.append(handler)
+
+    def publish(self, message):
+        payload = dumps(message)
+        if len(payload) > EVENTS_MAX_MESSAGE:
+            raise ValueError(f"Evento de {len(payload)} bytes (máximo {EVENTS_MAX_MESSAGE})")
+        for path in self.directory.glob("*.sock"):
+            try:
+                self._outbox.sendto(payload, str(path))
+            except (ConnectionRefusedError, FileNotFoundError):
+                path.unlink(missing_ok=True)  # worker que ya no existe
+            except BlockingIOError:
+                print("Worker sin leer eventos, se descarta uno para", path.name)
+
+    def _listen(self):
+        while True:
+            try:
+                data = self._inbox.recv(EVENTS_MAX_MESSAGE)
+            except OSError:
+                return  # socket cerrado
+            try:
+                message = loads(data)
+            except ValueError:
+                continue
+            for handler in self._handlers:
+                handler(message)
+
+    def close(self):
+        self._inbox.close()
+        self._outbox.close()
+        self.path.unlink(missing_ok=True)
+
+
+class EventHub:
+    def __init__(self, broker=None):
+        self._loop = None
+        self._seq = 0
+        self._subscribers = {}          # user_id -> set(asyncio.Queue)
+        self._buffers = OrderedDict()   # user_id -> _UserBuffer, LRU
+        self._evicted_seq = 0           # último seq de los buffers descartados por LRU
+        self.set_broker(broker or InProcessBroker())
+
+    def set_broker(self, broker):
+        self.broker = broker
+        broker.subscribe(self._receive)
+
+    def bind(self, loop):
+        """Event loop donde viven las conexiones (se llama en el arranque de la app)."""
+        self._loop = loop
+
+    # ----- publicar (cualquier hilo) -----
+    def publish(self, user_ids, type: str, data: dict):
+        """Evento `type` para cada usuario de `user_ids`. No bloquea ni falla si nadie escucha."""
+        try:
+            self.broker.publish({"users": list(dict.fromkeys(user_ids)), "type": type, "data": data})
+        except Exception as e:
+            print("No se pudo publicar el evento:", e)
+
+    def _receive(self, message):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._dispatch, message)
+
+    # ----- reparto (event loop) -----
+    def _dispatch(self, message):
+        for user_id in message["users"]:
+            self._seq += 1
+            event = Event(self._seq, message["type"], message["data"])
+            buf = self._buffers.get(user_id)
+            if buf is None:
+                buf = self._buffers[user_id] = _UserBuffer()
+                if len(self._buffers) > EVENTS_MAX_USERS:
+                    _, old = self._buffers.popitem(last=False)
+                    self._evicted_seq = max(self._evicted_seq, old.last_seq())
+            else:
+                self._buffers.move_to_end(user_id)
+            buf.append(event)
+            for queue in self._subscribers.get(user_id, ()):
+                try:
+                    queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    # Cliente que no lee: se descarta lo pendiente y se le pide recargar
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(RESYNC)
+
+    def subscribe(self, user_id) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def replay(self, user_id, last_event_id: str):
+        """
+        Eventos del usuario posteriores a last_event_id, o None si no se pueden
+        reconstruir (id de otro arranque o eventos que ya salieron del buffer).
+        """
+        boot, _, seq = last_event_id.partition("-")
+        if boot != _BOOT or not seq.isdigit():
+            return None
+        seq = int(seq)
+        buf = self._buffers.get(user_id)
+        if buf is None:
+            return None if seq < self._evicted_seq else []
+        if seq < buf.dropped_seq:
+            return None
+        return [e for e in buf.events if e.seq > seq]
+
+    def connections(self) -> int:
+        return sum(len(q) for q in self._subscribers.values())
+
+
+event_hub = EventHub()
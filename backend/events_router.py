@@ -0,0 +1,73 @@
+# backend/events_router.py
+# --------------------------------------------
+# GET /events: stream SSE con los cambios de citas del usuario
+# --------------------------------------------
+# EventSource no permite enviar headers, por eso el token también se acepta en ?token=.
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from backend.events import event_hub, RESYNC, EVENTS_HEARTBEAT
+from backend.security import verify_token
+from backend.serialization import dumps
+
+router = APIRouter()
+
+
+def _format(event) -> bytes:
+    head = f"event: {event.type}\n" if event is RESYNC else f"id: {event.id}\nevent: {event.type}\n"
+    return head.encode("ascii") + b"data: " + dumps(event.data) + b"\n\n"
+
+
+async def _stream(request: Request, user_id: int, last_event_id: Optional[str]):
+    queue = event_hub.subscribe(user_id)
+    try:
+        yield b"retry: 5000\n\n"
+        sent = 0
+        if last_event_id:
+            missed = event_hub.replay(user_id, last_event_id)
+            if missed is None:
+                yield _format(RESYNC)
+            else:
+                for event in missed:
+                    sent = event.seq
+                    yield _format(event)
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield b": ping\n\n"
+                continue
+            if event is not RESYNC and event.seq <= sent:
+                continue  # ya enviado en la reanudación
+            yield _format(event)
+    finally:
+        event_hub.unsubscribe(user_id, queue)
+
+
+@router.get("/events")
+async def events(
+    request: Request,
+    token: Optional[str] = Query(None),
+    authorization: str = Header(None),
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Eventos appointment.created / appointment.cancelled / appointment.completed del usuario.
+    Se reanuda desde el header Last-Event-ID (lo envía EventSource al reconectar);
+    si ya no se puede, llega un evento "resync" y el cliente debe recargar el historial.
+    """
+    if not token and authorization:
+        token = authorization.replace("Bearer", "").strip()
+    user = verify_token(token) if token else None
+    if user is None:
+        raise HTTPException(status_code=401, detail="Token inválido o expirado")
+    return StreamingResponse(
+        _stream(request, user.id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,142 @@
+# backend/idempotency.py
+# --------------------------------------------
+# Header Idempotency-Key para POST /appointments y POST /appointments/{id}/complete
+# --------------------------------------------
+# Un reintento con la misma clave devuelve la respuesta guardada sin volver a
+# escribir. La clave se inserta en idempotency_keys (PK user_id + clave) como
+# primera escritura de la misma transacción que hace el trabajo: si dos workers
+# reciben el mismo reintento a la vez, el segundo espera el bloqueo de la PK y
+# luego ve la respuesta del primero. Una LRU en memoria evita ir a MySQL en los
+# reintentos que caen en el mismo proceso. Solo se guardan respuestas exitosas:
+# si la escritura falla se revierte también la clave y el reintento se ejecuta.
+import hashlib
+import json
+import os
+import random
+from typing import Optional
+
+from fastapi import HTTPException
+from mysql.connector import IntegrityError
+
+from backend.serialization import FastJSONResponse, dumps, loads
+from backend.user_cache import LRUCache
+
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))          # segundos que vale una clave
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "4096"))
+IDEMPOTENCY_KEY_MAX = 100
+
+_responses = LRUCache(IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL)
+
+_DUPLICATE_KEY = 1062
+
+
+def _fingerprint(endpoint: str, payload) -> str:
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{endpoint}\n{canonical}".encode("utf-8")).hexdigest()
+
+
+def _replay(status_code: int, body) -> FastJSONResponse:
+    return FastJSONResponse(body, status_code=status_code, headers={"Idempotent-Replayed": "true"})
+
+
+class IdempotentRequest:
+    """
+    Uso en un handler:
+        idem = IdempotentRequest(user_id, key, "POST /appointments", payload)
+        if (r := idem.cached()): return r
+        ... if (r := idem.claim(conn, cur)): return r      # primera escritura de la transacción
+        ... trabajo ...
+        idem.store(cur, body); conn.commit(); idem.remember(body)
+    Sin header (key=None) todos los métodos son no-ops.
+    """
+
+    def __init__(self, user_id: int, key: Optional[str], endpoint: str, payload):
+        if key is not None and not (0 < len(key) <= IDEMPOTENCY_KEY_MAX):
+            raise HTTPException(status_code=400, detail="Idempotency-Key inválida")
+        self.key = key
+        self.user_id = user_id
+        self.endpoint = endpoint
+        self.fingerprint = _fingerprint(endpoint, payload) if key else None
+
+    def _check(self, endpoint, fingerprint):
+        if endpoint != self.endpoint or fingerprint != self.fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key ya usada con otra solicitud")
+
+    def cached(self) -> Optional[FastJSONResponse]:
+        """Respuesta guardada en la LRU de este proceso, si la hay."""
+        if self.key is None:
+            return None
+        hit = _responses.get((self.user_id, self.key))
+        if hit is None:
+            return None
+        endpoint, fingerprint, status_code, body = hit
+        self._check(endpoint, fingerprint)
+        return _replay(status_code, body)
+
+    def claim(self, conn, cur) -> Optional[FastJSONResponse]:
+        """
+        Reserva la clave dentro de la transacción actual. Si ya estaba usada
+        (otro request ya la completó), revierte y devuelve la respuesta guardada.
+        """
+        if self.key is None:
+            return None
+        for _ in range(2):
+            try:
+                cur.execute(
+                    "INSERT INTO idempotency_keys (user_id, idem_key, endpoint, request_hash, status_code, response_body) "
+                    "VALUES (%s, %s, %s, %s, 0, '')",
+                    (self.user_id, self.key, self.endpoint, self.fingerprint),
+                )
+                return None
+            except IntegrityError as e:
+                if e.errno != _DUPLICATE_KEY:
+                    raise
+            conn.rollback()
+            cur.execute(
+                "SELECT endpoint, request_hash, status_code, response_body, "
+                "created_at < NOW() - INTERVAL %s SECOND AS expired "
+                "FROM idempotency_keys WHERE user_id=%s AND idem_key=%s",
+                (IDEMPOTENCY_TTL, self.user_id, self.key),
+            )
+            row = cur.fetchone()
+            if row is None:
+                continue  # se borró entre medio: reintentar la reserva
+            endpoint, fingerprint, status_code, body, expired = _as_tuple(row)
+            if expired:
+                cur.execute("DELETE FROM idempotency_keys WHERE user_id=%s AND idem_key=%s",
+                            (self.user_id, self.key))
+                continue
+            self._check(endpoint, fingerprint)
+            if not status_code:
+                raise HTTPException(status_code=409, detail="Hay una solicitud en curso con esta Idempotency-Key")
+            body = loads(body)
+            _responses.set((self.user_id, self.key), (endpoint, fingerprint, status_code, body))
+            return _replay(status_code, body)
+        raise HTTPException(status_code=409, detail="Hay una solicitud en curso con esta Idempotency-Key")
+
+    def store(self, cur, body, status_code: int = 200):
+        """Guarda la respuesta en la misma transacción (antes del commit)."""
+        if self.key is None:
+            return
+        cur.execute(
+            "UPDATE idempotency_keys SET status_code=%s, response_body=%s WHERE user_id=%s AND idem_key=%s",
+            (status_code, dumps(body).decode("utf-8"), self.user_id, self.key),
+        )
+        # Limpieza perezosa de claves vencidas (una de cada ~100 escrituras)
+        if random.random() < 0.01:
+            cur.execute(
+                "DELETE FROM idempotency_keys WHERE created_at < NOW() - INTERVAL %s SECOND LIMIT 500",
+                (IDEMPOTENCY_TTL,),
+            )
+
+    def remember(self, body, status_code: int = 200):
+        """Después del commit: deja la respuesta en la LRU del proceso."""
+        if self.key is None:
+            return
+        _responses.set((self.user_id, self.key), (self.endpoint, self.fingerprint, status_code, body))
+
+
+def _as_tuple(row):
+    if isinstance(row, dict):
+        return row["endpoint"], row["request_hash"], row["status_code"], row["response_body"], row["expired"]
+    return row
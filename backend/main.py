@@ -1,9 +1,46 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
+import os
+from backend.database import get_pool, get_replica_pool, ConnectionScopeMiddleware, StickyWritesMiddleware
+from backend.security import bcrypt_executor, AUTH_SECRET_EPHEMERAL
+from backend.metrics import MetricsMiddleware, registry
+from backend.admission import AdmissionMiddleware
+from backend.serialization import FastJSONResponse
+from backend.static_assets import PrecompressedStatic
 from backend.user_router import router as user_router
 from backend.medical_router import router as medical_router
+from backend.admin_router import router as admin_router
+from backend.events_router import router as events_router
+from backend.search_router import router as search_router
+from backend.events import event_hub, UnixSocketBroker, EVENTS_BROKER_DIR
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if AUTH_SECRET_EPHEMERAL:
+        print("AUTH_SECRET no configurado: los tokens solo valen para este proceso")
+    # Pre-calienta el pool de MySQL; si la DB no está arriba, se abrirán conexiones bajo demanda
+    try:
+        get_pool().warm_up()
+        if get_replica_pool() is not None:
+            get_replica_pool().warm_up()
+    except Exception as e:
+        print("No se pudo pre-calentar el pool de MySQL:", e)
+    # Los eventos SSE se reparten en este event loop; con EVENTS_BROKER_DIR, entre todos los workers
+    event_hub.bind(asyncio.get_running_loop())
+    if EVENTS_BROKER_DIR:
+        event_hub.set_broker(UnixSocketBroker(EVENTS_BROKER_DIR))
+    yield
+    if isinstance(event_hub.broker, UnixSocketBroker):
+        event_hub.broker.close()
+    bcrypt_executor.shutdown()
+    get_pool().close_all()
+    if get_replica_pool() is not None:
+        get_replica_pool().close_all()
 
 # 👇 Mueve docs y openapi a rutas que no choque con "/"
 app = FastAPI(
@@ -11,8 +48,17 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/api/docs",
     openapi_url="/api/openapi.json",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
+# Devuelve al pool las conexiones que un request olvidó cerrar (y lo reporta)
+app.add_middleware(ConnectionScopeMiddleware)
+# Tras escribir, cookie para que las lecturas del cliente vayan al primario en cualquier worker
+app.add_middleware(StickyWritesMiddleware)
+# Cupos por clase de ruta (auth/reads/writes): 503 + Retry-After si MySQL no da abasto.
+# Va por dentro de CORS para que el navegador pueda leer el 503.
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -20,12 +66,26 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Latencia/status por ruta (va por fuera para medir el request completo)
+app.add_middleware(MetricsMiddleware)
 
 # API primero
 app.include_router(user_router, prefix="/api/v1")
 app.include_router(medical_router, prefix="/api/v1")
+app.include_router(admin_router, prefix="/api/v1")
+app.include_router(events_router, prefix="/api/v1")
+app.include_router(search_router, prefix="/api/v1")
+
+@app.get("/api/metrics", include_in_schema=False)
+def metrics():
+    """Métricas en formato texto de Prometheus."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 # Frontend después (sirviendo SPA en "/")
+# STATIC_MODE=memory (por defecto): precomprimido en memoria; disk: leído del disco en cada request (desarrollo)
 FRONTEND_DIR = Path(__file__).resolve().parent.parent / "frontend"
-app.mount("/", StaticFiles(directory=str(FRONTEND_DIR), html=True), name="frontend")
+if os.getenv("STATIC_MODE", "memory") == "disk":
+    app.mount("/", StaticFiles(directory=str(FRONTEND_DIR), html=True), name="frontend")
+else:
+    app.mount("/", PrecompressedStatic(FRONTEND_DIR), name="frontend")
 
@@ -1,10 +1,22 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Depends, Header, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional, Literal
-from datetime import datetime
-from backend.database import get_db_connection
-from backend.user_router import get_current_user_id  # ya existe en tu user_router
-from backend.database import get_db_connection
+from datetime import datetime, timedelta
+import csv
+import io
+from mysql.connector import Error as DBError
+from backend.database import get_db_connection, db_connection, mark_write
+from backend.user_router import get_current_user, get_current_user_id  # ya existe en tu user_router
+from backend.user_router import _parse_history_date
+from backend.security import TokenUser, is_admin_token
+from backend.availability import availability
+from backend.serialization import FastJSONResponse, dumps, dumps_line, loads
+from backend.events import event_hub
+from backend.idempotency import IdempotentRequest
+from backend.catalog import catalog, CATALOG_LIMIT, CATALOG_MAX_LIMIT
+from backend.archive import archived_before
+from backend.doctor_stats import StatsDelta, read_stats, STATS_DEFAULT_DAYS, STATS_MAX_DAYS, STATS_TOP_MEDICATIONS
 
 router = APIRouter()
 
@@ -24,20 +36,31 @@ class OrderIn(BaseModel):
     notes: Optional[str] = None
     scheduled_date: Optional[str] = None   # "YYYY-MM-DDTHH:MM"
 
+    @field_validator("scheduled_date")
+    @classmethod
+    def _normalize_scheduled_date(cls, v):
+        # Se valida al parsear el body (422 si es inválida) y queda como "YYYY-MM-DD HH:MM:SS"
+        if not v:
+            return None
+        iso = v.replace("T", " ")
+        if len(iso) == 16: iso += ":00"
+        try:
+            datetime.strptime(iso, "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            raise ValueError("Formato de fecha/hora inválido, se espera YYYY-MM-DDTHH:MM")
+        return iso
+
 class CompleteAppointmentIn(BaseModel):
     notes: Optional[str] = None
     prescriptions: List[PrescriptionIn] = []
     orders: List[OrderIn] = []
 
-def _user_role(cur, user_id: int):
-    cur.execute("SELECT role FROM users WHERE id=%s", (user_id,))
-    row = cur.fetchone()
-    if not row:
-        raise HTTPException(status_code=404, detail="Usuario no encontrado")
-    return row["role"]
-
 def _ensure_doctor_owns_appointment(cur, doctor_id: int, appointment_id: int):
-    cur.execute("SELECT doctor_id, status FROM appointments WHERE id=%s", (appointment_id,))
+    # FOR UPDATE: el estado leído es el que se reemplaza (lo necesitan las estadísticas)
+    cur.execute(
+        "SELECT doctor_id, patient_id, status, appointment_date FROM appointments WHERE id=%s FOR UPDATE",
+        (appointment_id,),
+    )
     a = cur.fetchone()
     if not a:
         raise HTTPException(status_code=404, detail="Cita no encontrada")
@@ -48,17 +71,28 @@ def _ensure_doctor_owns_appointment(cur, doctor_id: int, appointment_id: int):
 @router.post("/appointments/{appointment_id}/complete")
 def complete_appointment(appointment_id: int,
                          payload: CompleteAppointmentIn,
-                         user_id: int = Depends(get_current_user_id)):
+                         user: TokenUser = Depends(get_current_user),
+                         idempotency_key: Optional[str] = Header(None)):
+    # El rol viene en el token firmado
+    if user.role != "doctor":
+        raise HTTPException(status_code=403, detail="Solo los doctores pueden completar citas")
+    # Con Idempotency-Key un reintento no duplica nota, prescripciones ni órdenes
+    idem = IdempotentRequest(user.id, idempotency_key,
+                             f"POST /appointments/{appointment_id}/complete", payload.model_dump())
+    replay = idem.cached()
+    if replay:
+        return replay
     conn = get_db_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Error de conexión a la base de datos")
     try:
         cur = conn.cursor(dictionary=True)
-        role = _user_role(cur, user_id)
-        if role != "doctor":
-            raise HTTPException(status_code=403, detail="Solo los doctores pueden completar citas")
-
-        a = _ensure_doctor_owns_appointment(cur, user_id, appointment_id)
+        # La clave va primero: si hay que revertir para leer la respuesta guardada,
+        # el bloqueo de la cita se toma recién después
+        replay = idem.claim(conn, cur)
+        if replay:
+            return replay
+        a = _ensure_doctor_owns_appointment(cur, user.id, appointment_id)
 
         if payload.notes:
             cur.execute(
@@ -66,30 +100,47 @@ def complete_appointment(appointment_id: int,
                 (appointment_id, payload.notes)
             )
 
-        for p in payload.prescriptions:
-            cur.execute("""
+        # executemany agrupa las filas en un solo INSERT ... VALUES (...), (...)
+        if payload.prescriptions:
+            cur.executemany("""
                 INSERT INTO prescriptions
                 (appointment_id, medication_name, dose, route, frequency, duration, quantity, instructions)
                 VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-            """, (appointment_id, p.medication_name, p.dose, p.route, p.frequency, p.duration, p.quantity, p.instructions))
-
-        for o in payload.orders:
-            dt = None
-            if o.scheduled_date:
-                iso = o.scheduled_date.replace("T"," ")
-                if len(iso) == 16: iso += ":00"
-                dt = datetime.strptime(iso, "%Y-%m-%d %H:%M:%S")
-            cur.execute("""
+            """, [(appointment_id, p.medication_name, p.dose, p.route, p.frequency, p.duration, p.quantity, p.instructions)
+                  for p in payload.prescriptions])
+
+        if payload.orders:
+            cur.executemany("""
                 INSERT INTO orders
                 (appointment_id, type, name, priority, notes, scheduled_date)
                 VALUES (%s,%s,%s,%s,%s,%s)
-            """, (appointment_id, o.type, o.name, o.priority or 'normal', o.notes, dt))
+            """, [(appointment_id, o.type, o.name, o.priority or 'normal', o.notes, o.scheduled_date)
+                  for o in payload.orders])
 
-        if a["status"] != "completed":
-            cur.execute("UPDATE appointments SET status='completed' WHERE id=%s", (appointment_id,))
+        cur.execute(
+            "UPDATE appointments SET status='completed' WHERE id=%s AND status<>'completed'",
+            (appointment_id,)
+        )
 
+        stats = StatsDelta()
+        day = a["appointment_date"].date()
+        stats.status(user.id, day, a["status"], "completed")
+        stats.add_orders(user.id, day, payload.orders)
+        stats.add_prescriptions(user.id, day, payload.prescriptions)
+        stats.apply(cur)
+
+        body = {"msg": "Cita completada y registrada"}
+        idem.store(cur, body)
         conn.commit()
-        return {"msg": "Cita completada y registrada"}
+        idem.remember(body)
+        mark_write(f"user:{user.id}", f"user:{a['patient_id']}")
+        if a["status"] == "scheduled":
+            availability.remove(user.id, appointment_id)
+        catalog.record(payload.prescriptions, payload.orders)
+        if a["status"] != "completed":
+            event_hub.publish((a["patient_id"], user.id), "appointment.completed",
+                              {"appointment_id": appointment_id, "status": "completed"})
+        return body
     except HTTPException:
         raise
     except Exception as e:
@@ -100,93 +151,366 @@ def complete_appointment(appointment_id: int,
         except: pass
         conn.close()
 
+# Resumen completo de una o varias citas en un solo SELECT: prescripciones, órdenes
+# y última nota llegan como JSON agregado por MySQL (sin una consulta por tabla).
+# Las fechas se castean a CHAR para que ya vengan como "YYYY-MM-DD HH:MM:SS".
+# {suffix} es "" para las tablas vivas o "_archive" para las archivadas.
+_SUMMARY_SQL = """
+    SELECT a.id, a.patient_id, a.doctor_id, a.reason, a.status,
+           CAST(a.appointment_date AS CHAR) AS appointment_date,
+           p.full_name AS patient_name, d.full_name AS doctor_name, d.specialty,
+           (SELECT JSON_ARRAYAGG(JSON_OBJECT(
+                       'id', pr.id, 'appointment_id', pr.appointment_id,
+                       'medication_name', pr.medication_name, 'dose', pr.dose, 'route', pr.route,
+                       'frequency', pr.frequency, 'duration', pr.duration, 'quantity', pr.quantity,
+                       'instructions', pr.instructions, 'created_at', CAST(pr.created_at AS CHAR)))
+              FROM prescriptions{suffix} pr WHERE pr.appointment_id = a.id) AS prescriptions_json,
+           (SELECT JSON_ARRAYAGG(JSON_OBJECT(
+                       'id', o.id, 'appointment_id', o.appointment_id, 'type', o.type, 'name', o.name,
+                       'priority', o.priority, 'notes', o.notes,
+                       'scheduled_date', CAST(o.scheduled_date AS CHAR),
+                       'created_at', CAST(o.created_at AS CHAR)))
+              FROM orders{suffix} o WHERE o.appointment_id = a.id) AS orders_json,
+           (SELECT JSON_OBJECT('note', n.note, 'created_at', CAST(n.created_at AS CHAR))
+              FROM consult_notes{suffix} n WHERE n.appointment_id = a.id
+              ORDER BY n.id DESC LIMIT 1) AS note_json
+    FROM appointments{suffix} a
+    JOIN users p ON p.id=a.patient_id
+    JOIN users d ON d.id=a.doctor_id
+    WHERE {where}
+"""
+SUMMARY_BATCH_MAX = 100
+
+class SummaryBatchIn(BaseModel):
+    appointment_ids: List[int] = Field(..., min_length=1, max_length=SUMMARY_BATCH_MAX)
+
+def _summary_sql(where, archive=False):
+    """Resumen sobre las tablas vivas; con archive=True, UNION ALL con las *_archive (parámetros x2)."""
+    if not archive:
+        return _SUMMARY_SQL.format(suffix="", where=where)
+    return (f"({_SUMMARY_SQL.format(suffix='', where=where)}) UNION ALL "
+            f"({_SUMMARY_SQL.format(suffix='_archive', where=where)})")
+
+def _json_list(value):
+    # JSON_ARRAYAGG no garantiza orden: se ordena por id como antes
+    items = loads(value) if value else []
+    items.sort(key=lambda x: x["id"])
+    return items
+
+def _summary_from_row(a):
+    return {
+        "appointment": {
+            "id": a["id"],
+            "appointment_date": a["appointment_date"],
+            "reason": a["reason"],
+            "status": a["status"],
+            "patient_name": a["patient_name"],
+            "doctor_name": a["doctor_name"],
+            "specialty": a["specialty"],
+        },
+        "note": loads(a["note_json"]) if a["note_json"] else None,
+        "prescriptions": _json_list(a["prescriptions_json"]),
+        "orders": _json_list(a["orders_json"]),
+    }
+
 @router.get("/appointments/{appointment_id}/summary")
 def appointment_summary(appointment_id: int, user_id: int = Depends(get_current_user_id)):
-    conn = get_db_connection()
+    conn = get_db_connection(read=True, sticky_key=f"user:{user_id}")
     if not conn:
         raise HTTPException(status_code=500, detail="Error de conexión a la base de datos")
     try:
         cur = conn.cursor(dictionary=True)
-        cur.execute("""
-            SELECT a.*, p.full_name AS patient_name, d.full_name AS doctor_name, d.specialty
-            FROM appointments a
-            JOIN users p ON p.id=a.patient_id
-            JOIN users d ON d.id=a.doctor_id
-            WHERE a.id=%s
-        """, (appointment_id,))
-        a = cur.fetchone()
+        # Una cita está en las tablas vivas o en el archivo: se busca primero en las vivas
+        for suffix in ("", "_archive"):
+            cur.execute(_SUMMARY_SQL.format(suffix=suffix, where="a.id=%s"), (appointment_id,))
+            a = cur.fetchone()
+            if a:
+                break
         if not a:
             raise HTTPException(status_code=404, detail="Cita no encontrada")
         if user_id not in (a["patient_id"], a["doctor_id"]):
             raise HTTPException(status_code=403, detail="No autorizado")
+        return FastJSONResponse(_summary_from_row(a))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener detalle: {str(e)}")
+    finally:
+        try: cur.close()
+        except: pass
+        conn.close()
+
+@router.post("/appointments/summaries")
+def appointment_summaries(payload: SummaryBatchIn, user_id: int = Depends(get_current_user_id)):
+    """
+    Resúmenes de varias citas en una sola consulta (vista del día del doctor).
+    Devuelve los resúmenes en el orden pedido; las citas inexistentes o ajenas van en "missing".
+    """
+    ids = list(dict.fromkeys(payload.appointment_ids))
+    conn = get_db_connection(read=True, sticky_key=f"user:{user_id}")
+    if not conn:
+        raise HTTPException(status_code=500, detail="Error de conexión a la base de datos")
+    try:
+        cur = conn.cursor(dictionary=True)
+        by_id = {}
+        # Las que no están en las tablas vivas se buscan en el archivo
+        for suffix in ("", "_archive"):
+            pending = [i for i in ids if i not in by_id]
+            if not pending:
+                break
+            placeholders = ",".join(["%s"] * len(pending))
+            cur.execute(
+                _SUMMARY_SQL.format(
+                    suffix=suffix,
+                    where=f"a.id IN ({placeholders}) AND (a.patient_id=%s OR a.doctor_id=%s)",
+                ),
+                (*pending, user_id, user_id),
+            )
+            by_id.update((a["id"], _summary_from_row(a)) for a in cur.fetchall())
+        return FastJSONResponse({
+            "summaries": [by_id[i] for i in ids if i in by_id],
+            "missing": [i for i in ids if i not in by_id],
+        })
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener detalles: {str(e)}")
+    finally:
+        try: cur.close()
+        except: pass
+        conn.close()
+
+# ========== EXPORTACIÓN ==========
+EXPORT_FETCH_BATCH = 500
+# Mismas columnas que acepta scripts/import_data.py (más id y nombres, que se ignoran al importar)
+EXPORT_COLUMNS = ["id", "patient_id", "doctor_id", "appointment_date", "reason", "status", "notes",
+                  "prescriptions", "orders", "patient_name", "doctor_name", "specialty"]
+
+def _export_record(a):
+    note = loads(a["note_json"]) if a["note_json"] else None
+    return {
+        "id": a["id"],
+        "patient_id": a["patient_id"],
+        "doctor_id": a["doctor_id"],
+        "appointment_date": a["appointment_date"],
+        "reason": a["reason"],
+        "status": a["status"],
+        "notes": note["note"] if note else None,
+        "prescriptions": _json_list(a["prescriptions_json"]),
+        "orders": _json_list(a["orders_json"]),
+        "patient_name": a["patient_name"],
+        "doctor_name": a["doctor_name"],
+        "specialty": a["specialty"],
+    }
+
+def _stream_export(conn, cur, format):
+    """Envía las filas por lotes a medida que llegan del cursor sin buffer; cierra la conexión al final."""
+    try:
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        if format == "csv":
+            writer.writerow(EXPORT_COLUMNS)
+        while True:
+            rows = cur.fetchmany(EXPORT_FETCH_BATCH)
+            if not rows:
+                break
+            if format == "ndjson":
+                yield b"".join(dumps_line(_export_record(a)) for a in rows)
+                continue
+            for a in rows:
+                r = _export_record(a)
+                r["prescriptions"] = dumps(r["prescriptions"]).decode("utf-8")
+                r["orders"] = dumps(r["orders"]).decode("utf-8")
+                writer.writerow([r[c] for c in EXPORT_COLUMNS])
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+        conn.close()
+
+@router.get("/appointments/export")
+def export_appointments(
+    format: Literal["csv", "ndjson"] = "csv",
+    status: Optional[Literal["scheduled", "completed", "cancelled"]] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    doctor_id: Optional[int] = Query(None, description="Solo auditores (X-Admin-Token)"),
+    authorization: str = Header(None),
+    x_admin_token: str = Header(None),
+):
+    """
+    Exporta las citas del usuario (o de un doctor, para auditores) con su nota,
+    prescripciones y órdenes, en una sola consulta y sin cargar todo en memoria.
+    Incluye las citas archivadas salvo que el rango empiece después de la marca.
+    """
+    if is_admin_token(x_admin_token):
+        if doctor_id is None:
+            raise HTTPException(status_code=400, detail="doctor_id es obligatorio para auditoría")
+        where, params = ["a.doctor_id=%s"], [doctor_id]
+        sticky_key = None
+    else:
+        user = get_current_user(authorization)
+        if doctor_id is not None and doctor_id != user.id:
+            raise HTTPException(status_code=403, detail="No autorizado")
+        column = "a.doctor_id" if user.role == "doctor" else "a.patient_id"
+        where, params = [f"{column}=%s"], [user.id]
+        sticky_key = f"user:{user.id}"
+
+    dfrom = _parse_history_date(date_from, "date_from")
+    dto = _parse_history_date(date_to, "date_to", end=True)
+    if status:
+        where.append("a.status=%s")
+        params.append(status)
+    if dfrom:
+        where.append("a.appointment_date >= %s")
+        params.append(dfrom)
+    if dto:
+        where.append("a.appointment_date < %s")
+        params.append(dto)
+
+    conn = get_db_connection(read=True, sticky_key=sticky_key)
+    if not conn:
+        raise HTTPException(status_code=500, detail="Error de conexión a la base de datos")
+    try:
+        # A diferencia del historial, una exportación sin rango es "todo": el archivo
+        # se omite solo si no hay nada archivado o el rango empieza después de la marca
+        mark_cur = conn.cursor()
+        try:
+            mark = archived_before(mark_cur)
+        finally:
+            mark_cur.close()
+        archive = status != "scheduled" and mark is not None and (dfrom is None or dfrom < mark)
+        # Cursor sin buffer: las filas se leen del socket a medida que se envían
+        cur = conn.cursor(dictionary=True, buffered=False)
+        if archive:
+            # appointment_date ya viene como "YYYY-MM-DD HH:MM:SS": el orden de texto es el cronológico
+            cur.execute(
+                _summary_sql(" AND ".join(where), archive=True) + " ORDER BY appointment_date, id",
+                tuple(params) * 2,
+            )
+        else:
+            cur.execute(
+                _summary_sql(" AND ".join(where)) + " ORDER BY a.appointment_date, a.id",
+                tuple(params),
+            )
+    except Exception as e:
+        conn.close()
+        raise HTTPException(status_code=500, detail=f"Error al exportar: {str(e)}")
+
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _stream_export(conn, cur, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="citas.{format}"'},
+    )
+
+@router.get("/doctors/{doctor_id}/stats")
+def doctor_stats(
+    doctor_id: int,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    top: int = Query(STATS_TOP_MEDICATIONS, ge=1, le=50),
+    authorization: str = Header(None),
+    x_admin_token: str = Header(None),
+):
+    """
+    Citas por día y estado, órdenes por tipo/prioridad y medicamentos más recetados
+    en las citas del rango (por defecto, los últimos 30 días). Lo ve el propio doctor
+    o un administrador (X-Admin-Token); se lee de las tablas resumen, sin recorrer
+    el historial.
+    """
+    if is_admin_token(x_admin_token):
+        sticky_key = None
+    else:
+        user = get_current_user(authorization)
+        if user.role != "doctor" or user.id != doctor_id:
+            raise HTTPException(status_code=403, detail="No autorizado")
+        sticky_key = f"user:{user.id}"
 
-        from datetime import datetime  # arriba ya está importado
-
-        # Prescriptions
-        cur.execute("SELECT * FROM prescriptions WHERE appointment_id=%s ORDER BY id", (appointment_id,))
-        prescriptions = cur.fetchall()
-        for p in prescriptions:
-            if isinstance(p.get("created_at"), datetime):
-                p["created_at"] = p["created_at"].strftime("%Y-%m-%d %H:%M:%S")
-
-        # Orders
-        cur.execute("SELECT * FROM orders WHERE appointment_id=%s ORDER BY id", (appointment_id,))
-        orders = cur.fetchall()
-        for o in orders:
-            if isinstance(o.get("scheduled_date"), datetime):
-               o["scheduled_date"] = o["scheduled_date"].strftime("%Y-%m-%d %H:%M:%S")
-            if isinstance(o.get("created_at"), datetime):
-               o["created_at"] = o["created_at"].strftime("%Y-%m-%d %H:%M:%S")
-
-        # Nota (si existe)
-        cur.execute("SELECT note, created_at FROM consult_notes WHERE appointment_id=%s ORDER BY id DESC LIMIT 1", (appointment_id,))
-        note = cur.fetchone()
-        if note and isinstance(note.get("created_at"), datetime):
-            note["created_at"] = note["created_at"].strftime("%Y-%m-%d %H:%M:%S")
-
-
-        return {
-            "appointment": {
-                "id": a["id"],
-                "appointment_date": a["appointment_date"].strftime("%Y-%m-%d %H:%M:%S"),
-                "reason": a["reason"],
-                "status": a["status"],
-                "patient_name": a["patient_name"],
-                "doctor_name": a["doctor_name"],
-                "specialty": a["specialty"],
-            },
-            "note": note,
-            "prescriptions": prescriptions,
-            "orders": orders
-        }
-    
+    day_to = (_parse_history_date(date_to, "date_to") or datetime.now()).date()
+    if date_from:
+        day_from = _parse_history_date(date_from, "date_from").date()
+    else:
+        day_from = day_to - timedelta(days=STATS_DEFAULT_DAYS - 1)
+    if day_from > day_to:
+        raise HTTPException(status_code=400, detail="date_from no puede ser posterior a date_to")
+    if (day_to - day_from).days >= STATS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"El rango no puede superar {STATS_MAX_DAYS} días")
 
+    conn = get_db_connection(read=True, sticky_key=sticky_key)
+    if not conn:
+        raise HTTPException(status_code=500, detail="Error de conexión a la base de datos")
+    try:
+        cur = conn.cursor(dictionary=True)
+        return FastJSONResponse(read_stats(cur, doctor_id, day_from, day_to, top))
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al obtener detalle: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al obtener estadísticas: {str(e)}")
     finally:
         try: cur.close()
         except: pass
         conn.close()
 
-@router.put("/appointments/{appointment_id}/cancel")
-def cancel_appointment(appointment_id: int):
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def _catalog_lookup(user: TokenUser, lookup):
+    if user.role != "doctor":
+        raise HTTPException(status_code=403, detail="Solo los doctores pueden usar el catálogo")
+    try:
+        return {"suggestions": lookup()}
+    except DBError as e:
+        raise HTTPException(status_code=500, detail=f"Error al cargar el catálogo: {str(e)}")
 
-    # Verificar si la cita existe
-    cursor.execute("SELECT status FROM appointments WHERE id = %s", (appointment_id,))
-    appointment = cursor.fetchone()
-    if not appointment:
-        raise HTTPException(status_code=404, detail="Cita no encontrada")
+@router.get("/catalog/medications")
+def catalog_medications(q: str = Query(..., min_length=1, max_length=120),
+                        limit: int = Query(CATALOG_LIMIT, ge=1, le=CATALOG_MAX_LIMIT),
+                        user: TokenUser = Depends(get_current_user)):
+    """Autocompletado de medicamentos: nombres que empiezan (o tienen una palabra que empieza) con q, los más usados primero."""
+    return _catalog_lookup(user, lambda: catalog.medications(q, limit))
+
+@router.get("/catalog/orders")
+def catalog_orders(type: Literal['lab','imaging','procedure','referral'],
+                   q: str = Query(..., min_length=1, max_length=140),
+                   limit: int = Query(CATALOG_LIMIT, ge=1, le=CATALOG_MAX_LIMIT),
+                   user: TokenUser = Depends(get_current_user)):
+    """Autocompletado de nombres de órdenes del tipo indicado (lab, imaging, procedure, referral)."""
+    return _catalog_lookup(user, lambda: catalog.orders(type, q, limit))
+
+@router.put("/appointments/{appointment_id}/cancel")
+def cancel_appointment(appointment_id: int, user_id: int = Depends(get_current_user_id)):
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                # Verificar si la cita existe y pertenece al usuario
+                cursor.execute(
+                    "SELECT status, patient_id, doctor_id, appointment_date FROM appointments WHERE id = %s FOR UPDATE",
+                    (appointment_id,)
+                )
+                appointment = cursor.fetchone()
+                if not appointment:
+                    raise HTTPException(status_code=404, detail="Cita no encontrada")
+                if user_id not in (appointment[1], appointment[2]):
+                    raise HTTPException(status_code=403, detail="No autorizado para cancelar esta cita")
 
-    # Verificar si ya está cancelada o completada
-    if appointment[0] in ("cancelled", "completed"):
-        raise HTTPException(status_code=400, detail="La cita no puede cancelarse")
+                # Verificar si ya está cancelada o completada
+                if appointment[0] in ("cancelled", "completed"):
+                    raise HTTPException(status_code=400, detail="La cita no puede cancelarse")
 
-    # Actualizar estado
-    cursor.execute("UPDATE appointments SET status = 'cancelled' WHERE id = %s", (appointment_id,))
-    conn.commit()
+                # Actualizar estado
+                cursor.execute("UPDATE appointments SET status = 'cancelled' WHERE id = %s", (appointment_id,))
+                stats = StatsDelta()
+                stats.status(appointment[2], appointment[3].date(), appointment[0], "cancelled")
+                stats.apply(cursor)
+                conn.commit()
+                mark_write(f"user:{appointment[1]}", f"user:{appointment[2]}")
+                availability.remove(appointment[2], appointment_id)
+                event_hub.publish(appointment[1:3], "appointment.cancelled",
+                                  {"appointment_id": appointment_id, "status": "cancelled"})
+            finally:
+                cursor.close()
+    except DBError as e:
+        raise HTTPException(status_code=500, detail=f"Error al cancelar la cita: {str(e)}")
 
     return {"message": "Cita cancelada correctamente"}
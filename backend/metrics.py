@@ -0,0 +1,223 @@
+# backend/metrics.py
+# --------------------------------------------
+# Métricas en memoria con salida en formato texto de Prometheus
+# --------------------------------------------
+# Contadores, gauges e histogramas mínimos (sin dependencias). Cada observación
+# es un bisect + suma bajo un lock, para que el costo en el camino caliente sea despreciable.
+import bisect
+import re
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _fmt(v) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+    def set(self, labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][i] += 1
+            state[1] += value
+
+    def render(self):
+        with self._lock:
+            items = [(k, list(counts), total) for k, (counts, total) in self._values.items()]
+        lines = self.header()
+        for labels, counts, total in items:
+            acc = 0
+            for bound, c in zip(self.buckets, counts):
+                acc += c
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {acc}")
+            acc += counts[-1]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {acc}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {acc}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []  # funciones que actualizan gauges justo antes de exportar
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, fn):
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception:
+                pass
+        lines = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# ----- HTTP -----
+HTTP_REQUESTS = registry.register(Counter(
+    "http_requests_total", "Requests atendidos por ruta y status", ("method", "route", "status")))
+HTTP_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "Latencia de los requests por ruta", ("method", "route")))
+HTTP_IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight", "Requests en curso", ("method",)))
+
+# ----- Control de admisión -----
+ADMISSION_ACTIVE = registry.register(Gauge(
+    "admission_active_requests", "Requests admitidos en curso por clase", ("class",)))
+ADMISSION_QUEUE = registry.register(Gauge(
+    "admission_queue_depth", "Requests esperando turno por clase", ("class",)))
+ADMISSION_REJECTED = registry.register(Counter(
+    "admission_rejected_total", "Requests rechazados con 503 por clase y motivo", ("class", "reason")))
+
+# ----- SQL -----
+SQL_LATENCY = registry.register(Histogram(
+    "db_statement_duration_seconds", "Tiempo de ejecución por tipo de sentencia", ("statement",)))
+SQL_ROWS = registry.register(Counter(
+    "db_statement_rows_total", "Filas leídas o afectadas por tipo de sentencia", ("statement",)))
+SQL_SLOW = registry.register(Counter(
+    "db_slow_statements_total", "Sentencias por encima de DB_SLOW_QUERY_MS", ("statement",)))
+DB_POOL = registry.register(Gauge(
+    "db_pool_connections", "Conexiones del pool por estado", ("pool", "state")))
+DB_CONN_OLDEST = registry.register(Gauge(
+    "db_connection_oldest_checkout_seconds", "Antigüedad de la conexión prestada más vieja", ("pool",)))
+DB_CONN_HELD_LONG = registry.register(Counter(
+    "db_connections_held_too_long_total", "Conexiones retenidas más de DB_CONN_WARN_SECONDS", ("site",)))
+DB_CONN_LEAKS = registry.register(Counter(
+    "db_connection_leaks_total", "Conexiones no devueltas recuperadas al final del request o por el GC", ("site",)))
+DB_READ_ROUTING = registry.register(Counter(
+    "db_read_routing_total", "Conexiones de lectura según destino y motivo", ("target", "reason")))
+
+
+_VERB_RE = re.compile(r"\s*(\w+)(?:\s+`?(\w+))?")
+_TABLE_RE = re.compile(r"\b(?:FROM|INTO)\s+`?(\w+)", re.IGNORECASE)
+_fingerprints = {}
+
+def _main_table(sql: str):
+    # Primera tabla fuera de paréntesis (ignora subconsultas en la lista de columnas)
+    for m in _TABLE_RE.finditer(sql):
+        before = sql[:m.start()]
+        if before.count("(") == before.count(")"):
+            return m.group(1)
+    return None
+
+def statement_label(sql) -> str:
+    """Etiqueta de baja cardinalidad para una sentencia: 'SELECT appointments', 'INSERT orders', ..."""
+    label = _fingerprints.get(sql)
+    if label is None:
+        key = sql
+        if isinstance(sql, (bytes, bytearray)):
+            sql = sql.decode("utf-8", errors="replace")
+        m = _VERB_RE.match(sql)
+        verb = m.group(1).upper() if m else "?"
+        table = m.group(2) if verb == "UPDATE" and m else _main_table(sql)
+        label = f"{verb} {table.lower()}" if table else verb
+        if len(_fingerprints) < 4096:
+            _fingerprints[key] = label
+    return label
+
+
+class MetricsMiddleware:
+    """ASGI puro: latencia, status y requests en curso por ruta (plantilla, no path real)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc((method,))
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec((method,))
+            route = scope.get("route")
+            if route is not None:
+                name = route.path
+            elif scope["path"].startswith("/api"):
+                name = "unmatched"
+            else:
+                name = "static"
+            HTTP_LATENCY.observe((method, name), time.perf_counter() - start)
+            HTTP_REQUESTS.inc((method, name, str(status)))
@@ -0,0 +1,160 @@
+# backend/search_router.py
+# --------------------------------------------
+# GET /search: búsqueda de texto en las citas propias
+# --------------------------------------------
+# Busca en consult_notes.note, prescriptions(medication_name, instructions) y
+# orders.name con los índices FULLTEXT de db/init.sql (MATCH ... AGAINST en modo
+# booleano, cada palabra obligatoria y como prefijo). Los aciertos se agrupan por
+# cita y se ordenan por relevancia; solo se consideran las citas del usuario.
+# Como el historial, incluye las tablas *_archive solo si el rango pedido llega
+# antes de la marca del archivo.
+import re
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from backend.archive import history_needs_archive
+from backend.database import get_db_connection
+from backend.security import TokenUser
+from backend.serialization import FastJSONResponse
+from backend.user_router import get_current_user, _parse_history_date
+
+router = APIRouter()
+
+SEARCH_MAX_LIMIT = 100
+SEARCH_MAX_OFFSET = 1000
+SEARCH_MAX_TERMS = 8
+SEARCH_MIN_TERM = 3      # innodb_ft_min_token_size por defecto: palabras más cortas no están indexadas
+SEARCH_SNIPPET = 200     # caracteres de texto por coincidencia
+
+# Fuente -> (tabla, columnas del índice FULLTEXT, texto que se devuelve)
+_SOURCES = {
+    "note": ("consult_notes", "t.note", "t.note"),
+    "prescription": ("prescriptions", "t.medication_name, t.instructions",
+                     "CONCAT_WS(' - ', t.medication_name, t.instructions)"),
+    "order": ("orders", "t.name", "t.name"),
+}
+_OWNER = {"patient": "a.patient_id", "doctor": "a.doctor_id"}
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _boolean_query(q: str) -> str:
+    """'Amoxicilina 500mg' -> '+amoxicilina* +500mg*' (sin operadores del usuario)."""
+    terms = [t for t in _WORD.findall(q.lower()) if len(t) >= SEARCH_MIN_TERM][:SEARCH_MAX_TERMS]
+    if not terms:
+        raise HTTPException(status_code=400,
+                            detail=f"La búsqueda necesita al menos una palabra de {SEARCH_MIN_TERM} letras")
+    return " ".join(f"+{t}*" for t in terms)
+
+
+def _hits_sql(sources: List[str], where: str, archive: bool, with_text: bool) -> str:
+    """
+    UNION ALL de un MATCH por fuente (y por tabla viva/archivo), unido a la cita
+    para filtrar con `where`. Parámetros por rama: búsqueda, los de `where`, búsqueda.
+    """
+    parts = []
+    for suffix in ("", "_archive") if archive else ("",):
+        for source in sources:
+            table, columns, text = _SOURCES[source]
+            text = f"LEFT({text}, {SEARCH_SNIPPET})" if with_text else "NULL"
+            parts.append(
+                f"SELECT t.appointment_id, '{source}' AS source, {text} AS text, "
+                f"MATCH({columns}) AGAINST (%s IN BOOLEAN MODE) AS score "
+                f"FROM {table}{suffix} t JOIN appointments{suffix} a ON a.id = t.appointment_id "
+                f"WHERE {where} AND MATCH({columns}) AGAINST (%s IN BOOLEAN MODE)"
+            )
+    return " UNION ALL ".join(parts)
+
+
+@router.get("/search")
+def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    source: Optional[Literal["note", "prescription", "order"]] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=SEARCH_MAX_LIMIT),
+    offset: int = Query(0, ge=0, le=SEARCH_MAX_OFFSET),
+    user: TokenUser = Depends(get_current_user),
+):
+    """
+    Citas propias cuyas notas, prescripciones u órdenes contienen todas las palabras
+    de `q` (también como prefijo: "amoxi" encuentra "amoxicilina"), de la más a la
+    menos relevante. Cada resultado trae la cita y los textos que coincidieron.
+    Paginación con limit/offset; "next_offset" es null en la última página.
+    """
+    match = _boolean_query(q)
+    dfrom = _parse_history_date(date_from, "date_from")
+    dto = _parse_history_date(date_to, "date_to", end=True)
+    sources = [source] if source else list(_SOURCES)
+
+    where, where_params = [f"{_OWNER[user.role]} = %s"], [user.id]
+    if dfrom:
+        where.append("a.appointment_date >= %s")
+        where_params.append(dfrom)
+    if dto:
+        where.append("a.appointment_date < %s")
+        where_params.append(dto)
+
+    conn = get_db_connection(read=True, sticky_key=f"user:{user.id}")
+    if not conn:
+        raise HTTPException(status_code=500, detail="Error de conexión a la base de datos")
+    try:
+        cur = conn.cursor(dictionary=True)
+        archive = history_needs_archive(cur, dfrom, dto, None)
+        branches = len(sources) * (2 if archive else 1)
+
+        # 1) Página de citas ordenadas por relevancia total (solo ids y puntaje)
+        hits = _hits_sql(sources, " AND ".join(where), archive, with_text=False)
+        cur.execute(
+            f"SELECT appointment_id, SUM(score) AS score FROM ({hits}) h "
+            "GROUP BY appointment_id ORDER BY score DESC, appointment_id DESC LIMIT %s OFFSET %s",
+            tuple([match, *where_params, match] * branches) + (limit + 1, offset),
+        )
+        page = cur.fetchall()
+        next_offset = offset + limit if len(page) > limit else None
+        page = page[:limit]
+        if not page:
+            return FastJSONResponse({"results": [], "next_offset": None})
+        ids = [r["appointment_id"] for r in page]
+        marks = ", ".join(["%s"] * len(ids))
+
+        # 2) Contexto de esas citas (con el nombre de la otra parte) y los textos que coincidieron
+        if user.role == "patient":
+            other = "d.full_name AS doctor_name FROM {table} a JOIN users d ON d.id = a.doctor_id"
+        else:
+            other = "p.full_name AS patient_name FROM {table} a JOIN users p ON p.id = a.patient_id"
+        appointments = {}
+        for suffix in ("", "_archive") if archive else ("",):
+            cur.execute(
+                "SELECT a.id, a.appointment_date, a.reason, a.status, "
+                + other.format(table=f"appointments{suffix}") + f" WHERE a.id IN ({marks})",
+                tuple(ids),
+            )
+            for a in cur.fetchall():
+                appointments[a["id"]] = a
+        hits = _hits_sql(sources, f"a.id IN ({marks})", archive, with_text=True)
+        cur.execute(
+            f"SELECT appointment_id, source, text FROM ({hits}) h ORDER BY score DESC",
+            tuple([match, *ids, match] * branches),
+        )
+        matches = {i: [] for i in ids}
+        for m in cur.fetchall():
+            matches[m["appointment_id"]].append({"source": m["source"], "text": m["text"]})
+
+        results = [
+            {"appointment": appointments[r["appointment_id"]], "score": float(r["score"]),
+             "matches": matches[r["appointment_id"]]}
+            for r in page if r["appointment_id"] in appointments
+        ]
+        return FastJSONResponse({"results": results, "next_offset": next_offset})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en la búsqueda: {str(e)}")
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+        conn.close()
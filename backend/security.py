@@ -0,0 +1,159 @@
+# backend/security.py
+# --------------------------------------------
+# Hash de contraseñas con bcrypt fuera del threadpool de Starlette
+# y tokens de sesión firmados
+# --------------------------------------------
+# bcrypt es CPU puro y retiene el GIL: se ejecuta en un pool de procesos
+# dimensionado a los núcleos, con una cola acotada que responde 503 al saturarse.
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import multiprocessing
+import os
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Optional
+
+import bcrypt
+from fastapi import Header, HTTPException
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(os.cpu_count() or 1)))
+BCRYPT_QUEUE = int(os.getenv("BCRYPT_QUEUE", str(BCRYPT_WORKERS * 4)))  # trabajos en espera además de los que corren
+
+
+def _as_str(hashed) -> str:
+    # Asegurar que 'hashed' sea str (por si viene como bytes/BLOB de MySQL)
+    if isinstance(hashed, (bytes, bytearray)):
+        return hashed.decode("utf-8", errors="ignore")
+    return hashed
+
+def hash_password(plain: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    """Devuelve el hash bcrypt como string (utf-8) para guardar en la DB."""
+    return bcrypt.hashpw(plain.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+def verify_password(plain: str, hashed) -> bool:
+    """Verifica una contraseña en texto plano contra un hash almacenado (utf-8)."""
+    return bcrypt.checkpw(plain.encode("utf-8"), _as_str(hashed).encode("utf-8"))
+
+def hash_rounds(hashed) -> int:
+    """Costo con el que se generó un hash: '$2b$12$...' -> 12 (0 si no se reconoce)."""
+    parts = _as_str(hashed).split("$")
+    try:
+        return int(parts[2])
+    except (IndexError, ValueError):
+        return 0
+
+def needs_rehash(hashed) -> bool:
+    return hash_rounds(hashed) != BCRYPT_ROUNDS
+
+
+class BcryptExecutor:
+    """Pool de procesos para bcrypt con cola acotada (503 cuando se llena)."""
+
+    def __init__(self, workers: int = BCRYPT_WORKERS, queue_size: int = BCRYPT_QUEUE):
+        self.workers = max(workers, 1)
+        self.capacity = self.workers + max(queue_size, 0)
+        self._executor = None
+        self._pending = 0  # solo se toca desde el event loop, no necesita lock
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # 'spawn' evita heredar locks de los hilos del servidor al hacer fork
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.capacity:
+            raise HTTPException(
+                status_code=503,
+                detail="Servidor ocupado, intenta de nuevo",
+                headers={"Retry-After": "1"},
+            )
+        self._pending += 1
+        try:
+            return await asyncio.wrap_future(self._get_executor().submit(fn, *args))
+        finally:
+            self._pending -= 1
+
+    async def hash(self, plain: str) -> str:
+        return await self._run(hash_password, plain, BCRYPT_ROUNDS)
+
+    async def verify(self, plain: str, hashed) -> bool:
+        return await self._run(verify_password, plain, _as_str(hashed))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+bcrypt_executor = BcryptExecutor()
+
+
+# --------------------------------------------
+# Tokens firmados (HMAC-SHA256) con id, rol y expiración
+# --------------------------------------------
+# Formato: base64url(payload JSON) + "." + base64url(firma). Se verifican sin ir a MySQL.
+AUTH_SECRET = os.getenv("AUTH_SECRET", "")
+AUTH_TOKEN_TTL = int(os.getenv("AUTH_TOKEN_TTL", "43200"))  # segundos (12 h)
+
+# Sin secreto configurado cada proceso genera uno propio: los tokens no sirven entre
+# workers ni sobreviven a un reinicio. Suficiente para desarrollo local.
+AUTH_SECRET_EPHEMERAL = not AUTH_SECRET
+_AUTH_KEY = (AUTH_SECRET or secrets.token_urlsafe(32)).encode("utf-8")
+
+
+class TokenUser(NamedTuple):
+    id: int
+    role: str
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(_AUTH_KEY, payload.encode("ascii"), hashlib.sha256).digest())
+
+def issue_token(user_id: int, role: str, ttl: int = AUTH_TOKEN_TTL) -> str:
+    body = json.dumps({"sub": user_id, "role": role, "exp": int(time.time()) + ttl}, separators=(",", ":"))
+    payload = _b64encode(body.encode("utf-8"))
+    return f"{payload}.{_sign(payload)}"
+
+def verify_token(token: str) -> Optional[TokenUser]:
+    """Usuario del token si la firma es válida y no expiró; None en otro caso."""
+    try:
+        payload, signature = token.split(".")
+        if not hmac.compare_digest(signature, _sign(payload)):
+            return None
+        data = json.loads(_b64decode(payload))
+        if data["exp"] < time.time():
+            return None
+        return TokenUser(int(data["sub"]), data["role"])
+    except (ValueError, KeyError, TypeError, UnicodeError):
+        return None
+
+
+# --------------------------------------------
+# Acceso de administración (importación, auditoría)
+# --------------------------------------------
+# Token compartido en el header X-Admin-Token; sin ADMIN_TOKEN queda deshabilitado.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def is_admin_token(value: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN and value and hmac.compare_digest(value, ADMIN_TOKEN))
+
+def require_admin(x_admin_token: str = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Administración deshabilitada (falta ADMIN_TOKEN)")
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=401, detail="Token de administrador inválido")
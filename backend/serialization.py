@@ -0,0 +1,72 @@
+# backend/serialization.py
+# --------------------------------------------
+# Serialización JSON compartida por los routers
+# --------------------------------------------
+# JSONResponse de FastAPI pasa todo por jsonable_encoder (copia cada dict) y luego
+# por json.dumps. Aquí se serializa directo con orjson: datetime, Decimal y bytes se
+# convierten en el encoder, sin copiar filas ni llamar strftime en los routers.
+# Los handlers que devuelven FastJSONResponse(...) se saltan jsonable_encoder.
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # sin orjson se usa json de la librería estándar (más lento, mismo resultado)
+    orjson = None
+
+
+def _default(obj):
+    # Las fechas de MySQL se exponen como "YYYY-MM-DD HH:MM:SS", igual que antes
+    if isinstance(obj, datetime):
+        return obj.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(obj, (date, time)):
+        return obj.isoformat()
+    if isinstance(obj, timedelta):
+        return obj.total_seconds()
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.decode("utf-8", errors="replace")
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Tipo no serializable: {type(obj).__name__}")
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+    def dumps_line(obj) -> bytes:
+        """Una línea NDJSON (con el salto de línea incluido)."""
+        return orjson.dumps(obj, default=_default, option=_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+
+    loads = orjson.loads
+else:
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def dumps_line(obj) -> bytes:
+        return dumps(obj) + b"\n"
+
+    loads = json.loads
+
+
+class FastJSONResponse(JSONResponse):
+    """Respuesta JSON por defecto de la app (ver backend/main.py)."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def row_mapper(cur):
+    """
+    Función fila -> dict para un cursor de tuplas, con los nombres de columna
+    resueltos una sola vez (en lugar de un cursor dictionary=True).
+    """
+    columns = tuple(cur.column_names)
+    return lambda row: dict(zip(columns, row))
@@ -0,0 +1,139 @@
+# backend/static_assets.py
+# --------------------------------------------
+# Frontend servido desde memoria, ya comprimido
+# --------------------------------------------
+# Al arrancar se leen los archivos de frontend/ y se precalculan sus variantes
+# gzip (y brotli, si el paquete está instalado) con un ETag fuerte por variante.
+# Cada request solo negocia Accept-Encoding y responde desde memoria, o 304 si
+# el navegador ya tiene esa versión. index.html va con "no-cache" (se revalida
+# siempre, así un deploy se ve de inmediato); el resto se cachea STATIC_MAX_AGE.
+import gzip
+import hashlib
+import mimetypes
+import os
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se ofrece gzip
+    brotli = None
+
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "86400"))  # segundos
+STATIC_MIN_COMPRESS = 256  # bytes; por debajo no vale la pena comprimir
+
+_COMPRESSIBLE = ("text/", "application/javascript", "application/json", "application/xml", "image/svg+xml")
+
+
+def _etag(body: bytes, suffix: str = "") -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + suffix + '"'
+
+
+class StaticAsset:
+    """Un archivo del frontend con sus variantes: {encoding: (body, etag)}."""
+
+    def __init__(self, path: Path):
+        body = path.read_bytes()
+        media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        if media_type.startswith("text/") or media_type == "application/javascript":
+            media_type += "; charset=utf-8"
+        self.media_type = media_type
+        self.cache_control = "no-cache" if path.suffix == ".html" else f"public, max-age={STATIC_MAX_AGE}"
+        self.variants = {"identity": (body, _etag(body))}
+        if len(body) >= STATIC_MIN_COMPRESS and media_type.startswith(_COMPRESSIBLE):
+            gz = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(gz) < len(body):
+                self.variants["gzip"] = (gz, _etag(body, "-gz"))
+            if brotli is not None:
+                br = brotli.compress(body, quality=11)
+                if len(br) < len(body):
+                    self.variants["br"] = (br, _etag(body, "-br"))
+
+    def select(self, accept_encoding: str) -> str:
+        """Mejor codificación disponible según Accept-Encoding (br > gzip > identity)."""
+        accepted = {}
+        for part in accept_encoding.split(","):
+            name, _, params = part.strip().partition(";")
+            q = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    q = float(params[2:])
+                except ValueError:
+                    q = 0.0
+            if name:
+                accepted[name.strip().lower()] = q
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and accepted.get(encoding, accepted.get("*", 0)) > 0:
+                return encoding
+        return "identity"
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # Comparación débil (RFC 9110): W/"x" y "x" se consideran iguales
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class PrecompressedStatic:
+    """App ASGI que sirve un directorio desde memoria (reemplazo de StaticFiles con html=True)."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.assets = {}
+        for path in sorted(self.directory.rglob("*")):
+            if path.is_file():
+                self.assets[path.relative_to(self.directory).as_posix()] = StaticAsset(path)
+
+    def _lookup(self, path: str):
+        path = path.lstrip("/")
+        if path == "" or path.endswith("/"):
+            path += "index.html"
+        asset = self.assets.get(path)
+        if asset is None and f"{path}/index.html" in self.assets:
+            asset = self.assets[f"{path}/index.html"]
+        return asset
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        method = scope["method"]
+        if method not in ("GET", "HEAD"):
+            await self._send(send, 405, [(b"allow", b"GET, HEAD")], b"Method Not Allowed", method)
+            return
+
+        root_path = scope.get("root_path", "")
+        path = scope["path"]
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        asset = self._lookup(path)
+        if asset is None:
+            await self._send(send, 404, [(b"content-type", b"text/plain; charset=utf-8")], b"Not Found", method)
+            return
+
+        headers = {}
+        for name, value in scope["headers"]:
+            if name in (b"accept-encoding", b"if-none-match"):
+                headers[name] = value.decode("latin-1")
+        encoding = asset.select(headers.get(b"accept-encoding", ""))
+        body, etag = asset.variants[encoding]
+
+        common = [
+            (b"etag", etag.encode("ascii")),
+            (b"cache-control", asset.cache_control.encode("ascii")),
+            (b"vary", b"Accept-Encoding"),
+        ]
+        if b"if-none-match" in headers and _etag_matches(headers[b"if-none-match"], etag):
+            await self._send(send, 304, common, b"", method)
+            return
+        common.append((b"content-type", asset.media_type.encode("ascii")))
+        if encoding != "identity":
+            common.append((b"content-encoding", encoding.encode("ascii")))
+        await self._send(send, 200, common, body, method)
+
+    @staticmethod
+    async def _send(send, status, headers, body, method):
+        if status != 304:
+            headers = headers + [(b"content-length", str(len(body)).encode("ascii"))]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if method == "HEAD" or status == 304 else body})
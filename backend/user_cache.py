@@ -0,0 +1,70 @@
+# backend/user_cache.py
+# --------------------------------------------
+# Cache LRU con TTL de perfiles de usuario
+# --------------------------------------------
+# El rol ya viaja en el token; esta cache cubre las pocas consultas que aún
+# necesitan datos del usuario (p. ej. validar que un doctor exista al agendar).
+# Quien escribe en users llama a invalidate_user_profile después del commit, así
+# este worker no sirve el perfil viejo hasta que venza el TTL (los demás workers sí,
+# como mucho USER_CACHE_TTL).
+import os
+import threading
+import time
+from collections import OrderedDict
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))  # segundos
+
+
+class LRUCache:
+    """Diccionario acotado: descarta el menos usado al llenarse y expira entradas por TTL."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # clave -> (expira_en, valor)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+user_profiles = LRUCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+def invalidate_user_profile(user_id: int):
+    """Descarta el perfil cacheado (llamar después de confirmar un cambio en users)."""
+    user_profiles.invalidate(user_id)
+
+def get_user_profile(cur, user_id: int):
+    """
+    Perfil {id, full_name, email, role, specialty} desde la cache o, si no está, con el cursor dado.
+    Los usuarios inexistentes no se cachean (un registro nuevo se ve de inmediato).
+    """
+    profile = user_profiles.get(user_id)
+    if profile is None:
+        cur.execute("SELECT id, full_name, email, role, specialty FROM users WHERE id=%s", (user_id,))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        profile = dict(zip(cur.column_names, row)) if not isinstance(row, dict) else row
+        user_profiles.set(user_id, profile)
+    return profile
@@ -1,12 +1,26 @@
-from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, EmailStr
-from datetime import datetime
-from typing import Optional
-from backend.database import get_db_connection
-import bcrypt
+from datetime import datetime, timedelta
+from typing import Literal, Optional
+import base64
+from mysql.connector import Error as DBError, IntegrityError
+from backend.database import get_db_connection, db_connection, mark_write
+from backend.security import bcrypt_executor, needs_rehash, issue_token, verify_token, TokenUser
+from backend.user_cache import get_user_profile, invalidate_user_profile
+from backend.availability import availability, SLOT, APPOINTMENT_SLOT_MINUTES, AVAILABILITY_MAX_DAYS
+from backend.doctor_directory import doctor_directory
+from backend.events import event_hub
+from backend.idempotency import IdempotentRequest
+from backend.archive import history_needs_archive
+from backend.doctor_stats import StatsDelta
+from backend.serialization import FastJSONResponse, dumps_line, row_mapper
 
 router = APIRouter()
 
+_DUPLICATE_KEY = 1062  # errno de MySQL para una clave UNIQUE repetida
+
 # ========== MODELOS ==========
 class UserRegister(BaseModel):
     full_name: str
@@ -25,54 +39,30 @@ class AppointmentCreate(BaseModel):
     reason: str
 
 # ========== HELPERS ==========
-def hash_password(plain: str) -> str:
-    """Devuelve el hash bcrypt como string (utf-8) para guardar en la DB."""
-    return bcrypt.hashpw(plain.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-
-def verify_password(plain: str, hashed: str) -> bool:
-    """Verifica una contraseña en texto plano contra un hash almacenado (utf-8)."""
-    # Asegurar que 'hashed' sea str (por si viene como bytes/BLOB de MySQL)
-    if isinstance(hashed, (bytes, bytearray)):
-        hashed = hashed.decode("utf-8", errors="ignore")
-    return bcrypt.checkpw(plain.encode("utf-8"), hashed.encode("utf-8"))
-
-def get_current_user_id(authorization: str = Header(None)) -> int:
+def get_current_user(authorization: str = Header(None)) -> TokenUser:
     """
-    Lee el token desde el header Authorization.
-    Acepta 'Bearer 123' o '123'. En este ejemplo: token = id del usuario.
+    Lee el token desde el header Authorization ('Bearer <token>' o '<token>').
+    El token va firmado y trae id y rol, así que no se consulta MySQL.
     """
     if not authorization:
         raise HTTPException(status_code=401, detail="Falta encabezado Authorization")
     token = authorization.replace("Bearer", "").strip()
-    try:
-        return int(token)
-    except ValueError:
-        raise HTTPException(status_code=401, detail="Token inválido")
+    user = verify_token(token)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Token inválido o expirado")
+    return user
 
-# ========== ENDPOINTS ==========
+def get_current_user_id(user: TokenUser = Depends(get_current_user)) -> int:
+    return user.id
 
-@router.post("/register")
-def register_user(user: UserRegister):
+def _insert_user(user: UserRegister, pwd_hash: str):
     conn = get_db_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Error de conexión a la base de datos")
 
-    # Si no es doctor, specialty debe quedar en NULL (None)
-    if user.role not in ("patient", "doctor"):
-        raise HTTPException(status_code=400, detail="Rol inválido")
-    if user.role != "doctor":
-        user.specialty = None
-
     try:
         cur = conn.cursor(dictionary=True)
-
-        # ¿correo ya existe?
-        cur.execute("SELECT id FROM users WHERE email=%s", (user.email,))
-        if cur.fetchone():
-            raise HTTPException(status_code=400, detail="El correo ya está registrado")
-
-        pwd_hash = hash_password(user.password)
-
+        # El correo ya se revisó en _email_taken; la UNIQUE de users.email cubre la carrera
         cur.execute(
             """
             INSERT INTO users (full_name, email, password_hash, role, specialty)
@@ -81,9 +71,16 @@ def register_user(user: UserRegister):
             (user.full_name, user.email, pwd_hash, user.role, user.specialty),
         )
         conn.commit()
-
-        # Autologin simple: devolvemos datos mínimos para que el frontend haga login aparte si quiere
-        return {"msg": "Usuario creado correctamente"}
+        invalidate_user_profile(cur.lastrowid)
+        # El autologin y la lista de doctores deben ver este usuario aunque la réplica vaya atrás
+        mark_write(f"email:{user.email}", *(["doctors"] if user.role == "doctor" else []))
+    except HTTPException:
+        raise
+    except IntegrityError as e:
+        conn.rollback()
+        if e.errno == _DUPLICATE_KEY:
+            raise HTTPException(status_code=400, detail="El correo ya está registrado")
+        raise HTTPException(status_code=500, detail=f"Error al registrar: {str(e)}")
     except Exception as e:
         # Puedes loguear e en consola si quieres más detalle
         raise HTTPException(status_code=500, detail=f"Error al registrar: {str(e)}")
@@ -94,9 +91,18 @@ def register_user(user: UserRegister):
             pass
         conn.close()
 
-@router.post("/login")
-def login(user: UserLogin):
-    conn = get_db_connection()
+def _email_taken(email: str) -> bool:
+    # En el primario: un registro recién hecho puede no estar aún en la réplica
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT id FROM users WHERE email=%s", (email,))
+            return cur.fetchone() is not None
+        finally:
+            cur.close()
+
+def _fetch_login_row(email: str):
+    conn = get_db_connection(read=True, sticky_key=f"email:{email}")
     if not conn:
         raise HTTPException(status_code=500, detail="Error de conexión a la base de datos")
 
@@ -104,27 +110,9 @@ def login(user: UserLogin):
         cur = conn.cursor(dictionary=True)
         cur.execute(
             "SELECT id, full_name, email, password_hash, role, specialty FROM users WHERE email=%s",
-            (user.email,)
+            (email,)
         )
-        row = cur.fetchone()
-        if not row:
-            raise HTTPException(status_code=401, detail="Credenciales inválidas")
-
-        hashed = row["password_hash"]  # puede venir como bytes (BLOB) o str (VARCHAR)
-        if not verify_password(user.password, hashed):
-            raise HTTPException(status_code=401, detail="Credenciales inválidas")
-
-        # Token de ejemplo = id (suficiente para demo/POC).
-        return {
-            "token": str(row["id"]),
-            "user_id": row["id"],
-            "full_name": row["full_name"],
-            "email": row["email"],
-            "role": row["role"],
-            "specialty": row["specialty"],
-        }
-    except HTTPException:
-        raise
+        return cur.fetchone()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en login: {str(e)}")
     finally:
@@ -134,23 +122,133 @@ def login(user: UserLogin):
             pass
         conn.close()
 
+def _update_password_hash(user_id: int, pwd_hash: str):
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("UPDATE users SET password_hash=%s WHERE id=%s", (pwd_hash, user_id))
+            conn.commit()
+            invalidate_user_profile(user_id)
+        finally:
+            cur.close()
+
+# ========== ENDPOINTS ==========
+# register y login son async: bcrypt corre en el pool de procesos y la DB en el threadpool
+
+@router.post("/register")
+async def register_user(user: UserRegister):
+    # Si no es doctor, specialty debe quedar en NULL (None)
+    if user.role not in ("patient", "doctor"):
+        raise HTTPException(status_code=400, detail="Rol inválido")
+    if user.role != "doctor":
+        user.specialty = None
+
+    # Antes de hashear: un correo repetido no debe ocupar un lugar en el pool de bcrypt
+    try:
+        taken = await run_in_threadpool(_email_taken, user.email)
+    except DBError as e:
+        raise HTTPException(status_code=500, detail=f"Error al registrar: {str(e)}")
+    if taken:
+        raise HTTPException(status_code=400, detail="El correo ya está registrado")
+
+    pwd_hash = await bcrypt_executor.hash(user.password)
+    await run_in_threadpool(_insert_user, user, pwd_hash)
+    if user.role == "doctor":
+        doctor_directory.invalidate()
+
+    # Autologin simple: devolvemos datos mínimos para que el frontend haga login aparte si quiere
+    return {"msg": "Usuario creado correctamente"}
+
+@router.post("/login")
+async def login(user: UserLogin):
+    row = await run_in_threadpool(_fetch_login_row, user.email)
+    if not row:
+        raise HTTPException(status_code=401, detail="Credenciales inválidas")
+
+    hashed = row["password_hash"]  # puede venir como bytes (BLOB) o str (VARCHAR)
+    if not await bcrypt_executor.verify(user.password, hashed):
+        raise HTTPException(status_code=401, detail="Credenciales inválidas")
+
+    # Si cambió BCRYPT_ROUNDS, se re-hashea con el costo nuevo (mejor esfuerzo: no bloquea el login)
+    if needs_rehash(hashed):
+        try:
+            new_hash = await bcrypt_executor.hash(user.password)
+            await run_in_threadpool(_update_password_hash, row["id"], new_hash)
+        except Exception as e:
+            print("No se pudo re-hashear la contraseña:", e)
+
+    return {
+        "token": issue_token(row["id"], row["role"]),
+        "user_id": row["id"],
+        "full_name": row["full_name"],
+        "email": row["email"],
+        "role": row["role"],
+        "specialty": row["specialty"],
+    }
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
 @router.get("/doctors")
-def get_doctors():
+async def get_doctors(specialty: Optional[str] = None, if_none_match: Optional[str] = Header(None)):
     """
-    Lista de doctores (para llenar el select).
+    Lista de doctores (para llenar el select), servida desde el directorio en memoria.
     Formato que espera el frontend: { "doctors": [ {user_id, full_name, specialty}, ... ] }
+    Responde 304 si el cliente ya tiene la versión actual (If-None-Match).
+    """
+    cached = doctor_directory.cached(specialty)
+    if cached is None:
+        try:
+            cached = await run_in_threadpool(doctor_directory.get, specialty)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al listar doctores: {str(e)}")
+
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/doctors/{doctor_id}/availability")
+def get_doctor_availability(doctor_id: int,
+                            date_from: Optional[str] = Query(None, alias="from"),
+                            date_to: Optional[str] = Query(None, alias="to")):
     """
+    Franjas libres de un doctor entre `from` y `to` (YYYY-MM-DD, ambos inclusive).
+    Por defecto: los próximos 7 días. Respuesta: { "slots": ["YYYY-MM-DD HH:MM:SS", ...] }
+    """
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    day_from = _parse_history_date(date_from, "from") or today
+    day_to = _parse_history_date(date_to, "to") or day_from + timedelta(days=6)
+    day_from = day_from.replace(hour=0, minute=0, second=0)
+    day_to = day_to.replace(hour=0, minute=0, second=0)
+    if day_to < day_from:
+        raise HTTPException(status_code=400, detail="El rango de fechas es inválido")
+    if (day_to - day_from).days >= AVAILABILITY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"El rango máximo es de {AVAILABILITY_MAX_DAYS} días")
+
     conn = get_db_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Error de conexión a la base de datos")
 
     try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT id AS user_id, full_name, email, specialty FROM users WHERE role='doctor'")
-        doctors = cur.fetchall()
-        return {"doctors": doctors}
+        cur = conn.cursor()
+        doctor = get_user_profile(cur, doctor_id)
+        if not doctor or doctor["role"] != "doctor":
+            raise HTTPException(status_code=404, detail="Doctor no encontrado")
+        slots = availability.free_slots(cur, doctor_id, day_from, day_to)
+        return FastJSONResponse({
+            "doctor_id": doctor_id,
+            "slot_minutes": APPOINTMENT_SLOT_MINUTES,
+            "slots": slots,
+        })
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al listar doctores: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al obtener disponibilidad: {str(e)}")
     finally:
         try:
             cur.close()
@@ -159,11 +257,29 @@ def get_doctors():
         conn.close()
 
 @router.post("/appointments")
-def create_appointment(appointment: AppointmentCreate, user_id: int = Depends(get_current_user_id)):
+def create_appointment(appointment: AppointmentCreate,
+                       user_id: int = Depends(get_current_user_id),
+                       idempotency_key: Optional[str] = Header(None)):
     """
-    Crea una cita. Requiere header Authorization con el token (id del usuario).
+    Crea una cita. Requiere header Authorization con el token del usuario.
     Acepta fecha "YYYY-MM-DDTHH:MM" (agregamos :00 si no envían segundos).
+    Responde 409 si el doctor ya tiene una cita que se cruza con ese horario.
+    Con el header Idempotency-Key, un reintento devuelve la misma respuesta sin crear otra cita.
     """
+    idem = IdempotentRequest(user_id, idempotency_key, "POST /appointments", appointment.model_dump())
+    replay = idem.cached()
+    if replay:
+        return replay
+
+    # Parse fecha
+    iso = appointment.appointment_date.replace("T", " ")
+    if len(iso) == 16:  # YYYY-MM-DD HH:MM
+        iso += ":00"
+    try:
+        dt = datetime.strptime(iso, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha/hora inválido")
+
     conn = get_db_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Error de conexión a la base de datos")
@@ -171,19 +287,36 @@ def create_appointment(appointment: AppointmentCreate, user_id: int = Depends(ge
     try:
         cur = conn.cursor(dictionary=True)
 
-        # Validar que el doctor exista
-        cur.execute("SELECT id FROM users WHERE id=%s AND role='doctor'", (appointment.doctor_id,))
-        if not cur.fetchone():
+        # Reservar la clave de idempotencia antes de validar la agenda: un reintento
+        # de una cita ya creada se respondería como conflicto con ella misma
+        replay = idem.claim(conn, cur)
+        if replay:
+            return replay
+
+        # Validar que el doctor exista (perfil cacheado)
+        doctor = get_user_profile(cur, appointment.doctor_id)
+        if not doctor or doctor["role"] != "doctor":
             raise HTTPException(status_code=400, detail="Doctor no encontrado")
 
-        # Parse fecha
-        iso = appointment.appointment_date.replace("T", " ")
-        if len(iso) == 16:  # YYYY-MM-DD HH:MM
-            iso += ":00"
-        try:
-            dt = datetime.strptime(iso, "%Y-%m-%d %H:%M:%S")
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Formato de fecha/hora inválido")
+        # El choque lo decide MySQL, no la agenda en memoria (con varios workers puede
+        # estar vieja). Bloquear al doctor serializa las reservas concurrentes (también
+        # entre workers). La búsqueda del rango es una lectura con bloqueo: lee lo último
+        # confirmado y no la foto de REPEATABLE READ, que pudo fijarse antes (perfil del
+        # doctor) y no vería una cita confirmada mientras se esperaba el bloqueo.
+        cur.execute("SELECT id FROM users WHERE id=%s FOR UPDATE", (appointment.doctor_id,))
+        cur.fetchall()
+        cur.execute(
+            """
+            SELECT id FROM appointments
+            WHERE doctor_id=%s AND status='scheduled'
+              AND appointment_date > %s AND appointment_date < %s
+            LIMIT 1 FOR UPDATE
+            """,
+            (appointment.doctor_id, dt - SLOT, dt + SLOT),
+        )
+        if cur.fetchall():
+            conn.rollback()
+            raise HTTPException(status_code=409, detail="El doctor ya tiene una cita en ese horario")
 
         cur.execute(
             """
@@ -192,11 +325,28 @@ def create_appointment(appointment: AppointmentCreate, user_id: int = Depends(ge
             """,
             (user_id, appointment.doctor_id, dt, appointment.reason, "scheduled"),
         )
+        appointment_id = cur.lastrowid
+        stats = StatsDelta()
+        stats.status(appointment.doctor_id, dt.date(), None, "scheduled")
+        stats.apply(cur)
+        body = {"msg": "Cita creada correctamente", "appointment_id": appointment_id}
+        idem.store(cur, body)
         conn.commit()
-        return {"msg": "Cita creada correctamente"}
+        idem.remember(body)
+        mark_write(f"user:{user_id}", f"user:{appointment.doctor_id}")
+        availability.add(appointment.doctor_id, appointment_id, dt)
+        event_hub.publish((user_id, appointment.doctor_id), "appointment.created", {
+            "appointment_id": appointment_id,
+            "status": "scheduled",
+            "appointment_date": dt,
+            "doctor_id": appointment.doctor_id,
+            "patient_id": user_id,
+        })
+        return body
     except HTTPException:
         raise
     except Exception as e:
+        conn.rollback()
         raise HTTPException(status_code=500, detail=f"Error al crear la cita: {str(e)}")
     finally:
         try:
@@ -205,84 +355,186 @@ def create_appointment(appointment: AppointmentCreate, user_id: int = Depends(ge
             pass
         conn.close()
 
+# Historial: columnas y join según el rol de quien consulta
+_HISTORY_BY_ROLE = {
+    "patient": (
+        "a.patient_id",
+        "d.full_name AS doctor_name, d.email AS doctor_email, d.specialty",
+        "JOIN users d ON d.id = a.doctor_id",
+    ),
+    "doctor": (
+        "a.doctor_id",
+        "p.full_name AS patient_name, p.email AS patient_email",
+        "JOIN users p ON p.id = a.patient_id",
+    ),
+}
+HISTORY_MAX_LIMIT = 500
+HISTORY_FETCH_BATCH = 500
+
+def _parse_history_date(value: Optional[str], field: str, end: bool = False) -> Optional[datetime]:
+    """'YYYY-MM-DD' o 'YYYY-MM-DDTHH:MM[:SS]'. Si es solo fecha y end=True, incluye todo el día."""
+    if not value:
+        return None
+    try:
+        if len(value) == 10:
+            dt = datetime.strptime(value, "%Y-%m-%d")
+            return dt + timedelta(days=1) if end else dt
+        iso = value.replace("T", " ")
+        if len(iso) == 16:
+            iso += ":00"
+        dt = datetime.strptime(iso, "%Y-%m-%d %H:%M:%S")
+        return dt + timedelta(seconds=1) if end else dt
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Formato de fecha inválido en {field}")
+
+def _encode_cursor(appointment_date: datetime, appointment_id: int) -> str:
+    raw = f"{appointment_date.strftime('%Y-%m-%d %H:%M:%S')}|{appointment_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        date_part, id_part = raw.split("|")
+        return datetime.strptime(date_part, "%Y-%m-%d %H:%M:%S"), int(id_part)
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def _history_query(role, user_id, status, date_from, date_to, after, limit, archive=False):
+    """
+    SELECT paginado por keyset sobre (appointment_date, id) descendente.
+    Usa los índices appointments(patient_id|doctor_id, appointment_date, id).
+    Con archive=True une (UNION ALL) la misma consulta sobre appointments_archive.
+    """
+    owner_col, columns, join = _HISTORY_BY_ROLE[role]
+    where = [f"{owner_col} = %s"]
+    params = [user_id]
+    if status:
+        where.append("a.status = %s")
+        params.append(status)
+    if date_from:
+        where.append("a.appointment_date >= %s")
+        params.append(date_from)
+    if date_to:
+        where.append("a.appointment_date < %s")
+        params.append(date_to)
+    if after:
+        where.append("(a.appointment_date < %s OR (a.appointment_date = %s AND a.id < %s))")
+        params.extend([after[0], after[0], after[1]])
+    select = f"""
+        SELECT a.id, a.appointment_date, a.reason, a.status, {columns}
+        FROM {{table}} a
+        {join}
+        WHERE {" AND ".join(where)}
+        ORDER BY a.appointment_date DESC, a.id DESC
+    """
+    if limit:
+        select += " LIMIT %s"
+        params.append(limit + 1)  # una fila extra para saber si hay otra página
+    if not archive:
+        return select.format(table="appointments"), tuple(params)
+    # Cada rama trae a lo sumo limit+1 filas por su índice; el orden final es sobre la unión
+    sql = f"""
+        ({select.format(table="appointments")})
+        UNION ALL
+        ({select.format(table="appointments_archive")})
+        ORDER BY appointment_date DESC, id DESC
+    """
+    if limit:
+        sql += " LIMIT %s"
+    return sql, tuple(params) * 2 + ((limit + 1,) if limit else ())
+
+def _history_rows(cur, limit, page):
+    """Itera las filas del historial por lotes; deja en page["next_cursor"] el cursor siguiente (o None)."""
+    page["next_cursor"] = None
+    to_dict = row_mapper(cur)
+    sent = 0
+    last = None
+    while True:
+        rows = cur.fetchmany(HISTORY_FETCH_BATCH)
+        if not rows:
+            return
+        for r in rows:
+            if limit and sent == limit:
+                # Hay al menos una fila más: el cursor apunta a la última enviada
+                cur.fetchall()
+                page["next_cursor"] = _encode_cursor(last[1], last[0])
+                return
+            last = r  # (id, appointment_date, ...) según _history_query
+            sent += 1
+            yield to_dict(r)
+
+def _stream_history(conn, cur, limit):
+    try:
+        page = {}
+        for r in _history_rows(cur, limit, page):
+            yield dumps_line(r)
+        if page["next_cursor"]:
+            yield dumps_line({"next_cursor": page["next_cursor"]})
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+        conn.close()
+
 @router.get("/appointments/history")
-def get_appointment_history(user_id: int = Depends(get_current_user_id)):
+def get_appointment_history(
+    user: TokenUser = Depends(get_current_user),
+    limit: Optional[int] = Query(None, ge=1, le=HISTORY_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    status: Optional[Literal["scheduled", "completed", "cancelled"]] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+):
     """
     Historial de citas. Si el usuario es paciente -> ve sus citas con los doctores.
     Si es doctor -> ve sus citas con pacientes.
     Respuesta que espera el frontend: { "history": [...] }
+
+    Paginación opcional por cursor: con `limit` se devuelve además "next_cursor",
+    que se envía como `cursor` para pedir la página siguiente (más antigua).
+    Con format=ndjson se envía una cita por línea a medida que llegan de MySQL;
+    si hay más páginas, la última línea es {"next_cursor": ...}.
+    Las citas archivadas aparecen solo si date_from/date_to piden fechas anteriores
+    a la marca del archivo (scripts/archive_appointments.py).
     """
-    conn = get_db_connection()
+    after = _decode_cursor(cursor) if cursor else None
+    dfrom = _parse_history_date(date_from, "date_from")
+    dto = _parse_history_date(date_to, "date_to", end=True)
+
+    conn = get_db_connection(read=True, sticky_key=f"user:{user.id}")
     if not conn:
         raise HTTPException(status_code=500, detail="Error de conexión a la base de datos")
 
+    streaming = False
     try:
-        cur = conn.cursor(dictionary=True)
-
-        # Saber rol del usuario
-        cur.execute("SELECT role FROM users WHERE id=%s", (user_id,))
-        u = cur.fetchone()
-        if not u:
-            raise HTTPException(status_code=404, detail="Usuario no encontrado")
-
-        if u["role"] == "patient":
-            cur.execute(
-                """
-                SELECT a.id, a.appointment_date, a.reason, a.status,
-                       d.full_name AS doctor_name, d.email AS doctor_email, d.specialty
-                FROM appointments a
-                JOIN users d ON d.id = a.doctor_id
-                WHERE a.patient_id = %s
-                ORDER BY a.appointment_date DESC
-                """,
-                (user_id,),
-            )
-            rows = cur.fetchall()
-            history = [
-                {
-                    "id": r["id"],
-                    "appointment_date": r["appointment_date"].strftime("%Y-%m-%d %H:%M:%S"),
-                    "reason": r["reason"],
-                    "status": r["status"],
-                    "doctor_name": r["doctor_name"],
-                    "doctor_email": r["doctor_email"],
-                    "specialty": r["specialty"],
-                }
-                for r in rows
-            ]
-            return {"history": history}
-
-        # role = doctor
-        cur.execute(
-            """
-            SELECT a.id, a.appointment_date, a.reason, a.status,
-                   p.full_name AS patient_name, p.email AS patient_email
-            FROM appointments a
-            JOIN users p ON p.id = a.patient_id
-            WHERE a.doctor_id = %s
-            ORDER BY a.appointment_date DESC
-            """,
-            (user_id,),
-        )
-        rows = cur.fetchall()
-        history = [
-            {
-                "id": r["id"],
-                "appointment_date": r["appointment_date"].strftime("%Y-%m-%d %H:%M:%S"),
-                "reason": r["reason"],
-                "status": r["status"],
-                "patient_name": r["patient_name"],
-                "patient_email": r["patient_email"],
-            }
-            for r in rows
-        ]
-        return {"history": history}
+        cur = conn.cursor()
+
+        # Las citas archivadas solo se consultan si el rango pedido llega antes de la marca del archivo
+        archive = history_needs_archive(cur, dfrom, dto, status)
+        # El rol viene en el token
+        sql, params = _history_query(user.role, user.id, status, dfrom, dto, after, limit, archive)
+        cur.execute(sql, params)
+
+        if format == "ndjson":
+            # La conexión queda en manos del generador, que la cierra al terminar
+            streaming = True
+            return StreamingResponse(_stream_history(conn, cur, limit), media_type="application/x-ndjson")
+
+        page = {}
+        history = list(_history_rows(cur, limit, page))
+        if limit:
+            return FastJSONResponse({"history": history, "next_cursor": page["next_cursor"]})
+        return FastJSONResponse({"history": history})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener historial: {str(e)}")
     finally:
-        try:
-            cur.close()
-        except Exception:
-            pass
-        conn.close()
-
+        if not streaming:
+            try:
+                cur.close()
+            except Exception:
+                pass
+            conn.close()
@@ -0,0 +1,53 @@
+# bench/compare.py
+# --------------------------------------------
+# Compara dos resultados de bench/run.py y marca regresiones
+# --------------------------------------------
+# Uso: python -m bench.compare antes.json despues.json [--threshold 10]
+# Sale con código 1 si algún endpoint empeora más del umbral (p95 o throughput).
+import argparse
+import json
+import sys
+
+
+def _pct(before, after):
+    if not before or after is None:
+        return None
+    return (after - before) / before * 100.0
+
+def compare(before, after, threshold):
+    rows, regressions = [], []
+    for name, b in before["endpoints"].items():
+        a = after["endpoints"].get(name)
+        if a is None:
+            continue
+        d_rps = _pct(b["throughput_rps"], a["throughput_rps"])
+        d_p95 = _pct(b["latency_ms"]["p95"], a["latency_ms"]["p95"])
+        d_p99 = _pct(b["latency_ms"]["p99"], a["latency_ms"]["p99"])
+        rows.append((name, b, a, d_rps, d_p95, d_p99))
+        if (d_rps is not None and d_rps < -threshold) or (d_p95 is not None and d_p95 > threshold):
+            regressions.append(name)
+    return rows, regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara dos corridas del benchmark")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="porcentaje tolerado")
+    args = parser.parse_args()
+
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+
+    rows, regressions = compare(before, after, args.threshold)
+    fmt = lambda v: f"{v:+9.1f}%" if v is not None else f"{'-':>10}"
+    print(f"{'endpoint':<14}{'req/s antes':>13}{'req/s desp.':>13}{'Δ req/s':>10}{'Δ p95':>10}{'Δ p99':>10}")
+    for name, b, a, d_rps, d_p95, d_p99 in rows:
+        mark = "  <-- regresión" if name in regressions else ""
+        print(f"{name:<14}{b['throughput_rps']:>13.1f}{a['throughput_rps']:>13.1f}"
+              f"{fmt(d_rps)}{fmt(d_p95)}{fmt(d_p99)}{mark}")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# bench/local_mysql.py
+# --------------------------------------------
+# Servidor MySQL/MariaDB desechable para benchmarks (sin Docker)
+# --------------------------------------------
+# Usa el binario mysqld o mariadbd instalado en la máquina: crea un datadir
+# temporal, levanta el servidor en un puerto libre y crea el usuario "bench".
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+
+import mysql.connector
+
+BENCH_USER = "bench"
+BENCH_PASSWORD = "bench"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def find_server():
+    """(ruta, es_mariadb) del primer servidor encontrado en el PATH, o (None, False)."""
+    for name, is_maria in (("mariadbd", True), ("mysqld", False)):
+        path = shutil.which(name)
+        if path:
+            return path, is_maria
+    return None, False
+
+
+class LocalMySQL:
+    def __init__(self, port=None):
+        self.server, self.is_mariadb = find_server()
+        if not self.server:
+            raise RuntimeError("No se encontró mysqld ni mariadbd en el PATH")
+        self.port = port or _free_port()
+        self.base_dir = tempfile.mkdtemp(prefix="medigo-bench-mysql-")
+        self.datadir = os.path.join(self.base_dir, "data")
+        self.socket = os.path.join(self.base_dir, "mysqld.sock")
+        self.proc = None
+
+    def _user_args(self):
+        # mysqld se niega a correr como root si no se le indica explícitamente
+        return ["--user=root"] if hasattr(os, "geteuid") and os.geteuid() == 0 else []
+
+    def _initialize(self):
+        log = os.path.join(self.base_dir, "init.log")
+        if self.is_mariadb:
+            installer = shutil.which("mariadb-install-db") or shutil.which("mysql_install_db")
+            if not installer:
+                raise RuntimeError("No se encontró mariadb-install-db")
+            cmd = [installer, "--no-defaults", f"--datadir={self.datadir}",
+                   "--auth-root-authentication-method=normal", *self._user_args()]
+        else:
+            cmd = [self.server, "--no-defaults", "--initialize-insecure",
+                   f"--datadir={self.datadir}", *self._user_args()]
+        with open(log, "w") as out:
+            subprocess.run(cmd, check=True, stdout=out, stderr=subprocess.STDOUT)
+
+    def start(self, timeout=60):
+        self._initialize()
+        cmd = [self.server, "--no-defaults", f"--datadir={self.datadir}",
+               f"--port={self.port}", "--bind-address=127.0.0.1",
+               f"--socket={self.socket}", f"--pid-file={os.path.join(self.base_dir, 'mysqld.pid')}",
+               f"--log-error={os.path.join(self.base_dir, 'error.log')}",
+               "--max-connections=500", *self._user_args()]
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                cnx = mysql.connector.connect(unix_socket=self.socket, user="root", password="")
+                break
+            except mysql.connector.Error:
+                if self.proc.poll() is not None or time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError(f"El servidor no arrancó; ver {self.base_dir}/error.log")
+                time.sleep(0.5)
+        cur = cnx.cursor()
+        cur.execute(f"CREATE USER '{BENCH_USER}'@'%' IDENTIFIED BY '{BENCH_PASSWORD}'")
+        cur.execute(f"GRANT ALL PRIVILEGES ON *.* TO '{BENCH_USER}'@'%'")
+        cur.close()
+        cnx.close()
+        return self
+
+    def env(self, db_name):
+        """Variables DB_* para apuntar la app y el seed a este servidor."""
+        return {
+            "DB_HOST": "127.0.0.1",
+            "DB_PORT": str(self.port),
+            "DB_USER": BENCH_USER,
+            "DB_PASSWORD": BENCH_PASSWORD,
+            "DB_NAME": db_name,
+        }
+
+    def stop(self):
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
@@ -0,0 +1,386 @@
+# bench/run.py
+# --------------------------------------------
+# Benchmark por endpoint: levanta backend.main:app contra una base sembrada
+# y mide throughput y latencias p50/p95/p99 con carga concurrente
+# --------------------------------------------
+# Uso típico (servidor MySQL desechable, sin Docker):
+#   python -m bench.run --local-mysql --concurrency 16 --duration 15
+# Contra un MySQL existente (variables DB_* del .env, crea la base --database):
+#   python -m bench.run --database app_medica_bench
+# Comparar dos corridas:
+#   python -m bench.compare bench/results/antes.json bench/results/despues.json
+import argparse
+import http.client
+import itertools
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from bench import seed as seeding
+from bench.local_mysql import LocalMySQL
+
+ENDPOINTS = ["login", "doctors", "history", "summary", "appointments", "complete"]
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+API = "/api/v1"
+
+
+# ---------- utilidades ----------
+def percentile(sorted_values, pct):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+class Client:
+    """Conexión HTTP keep-alive por hilo."""
+
+    def __init__(self, port):
+        self.port = port
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+            try:
+                self.conn.request(method, path, body=payload, headers=headers)
+                resp = self.conn.getresponse()
+                data = resp.read()
+                return resp.status, data
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                if attempt == 2:
+                    raise
+
+
+# ---------- servidor ----------
+def start_server(env, workers):
+    port = _free_port()
+    cmd = [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1",
+           "--port", str(port), "--workers", str(workers), "--log-level", "warning", "--no-access-log"]
+    proc = subprocess.Popen(cmd, env={**os.environ, **env},
+                            cwd=os.path.join(os.path.dirname(__file__), ".."))
+    client = Client(port)
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            status, _ = client.request("GET", "/api/openapi.json")
+            if status == 200:
+                return proc, port
+        except OSError:
+            pass
+        if proc.poll() is not None or time.monotonic() > deadline:
+            proc.kill()
+            raise RuntimeError("uvicorn no arrancó")
+        time.sleep(0.3)
+
+def stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+# ---------- escenarios ----------
+class Population:
+    """Muestra de usuarios y citas de la base sembrada, con sus tokens."""
+
+    def __init__(self, cnx, sample_size, rnd):
+        cur = cnx.cursor()
+        cur.execute("SELECT id, email, role FROM users")
+        users = cur.fetchall()
+        doctors = [u for u in users if u[2] == "doctor"]
+        patients = [u for u in users if u[2] == "patient"]
+        self.doctor_ids = [u[0] for u in doctors]
+        self.doctors = rnd.sample(doctors, min(sample_size, len(doctors)))
+        self.patients = rnd.sample(patients, min(sample_size, len(patients)))
+        self.all_emails = [u[1] for u in users]
+
+        sampled = [u[0] for u in self.doctors + self.patients]
+        marks = ",".join(["%s"] * len(sampled))
+        cur.execute(f"SELECT id, patient_id, doctor_id, status FROM appointments "
+                    f"WHERE doctor_id IN ({marks}) OR patient_id IN ({marks})", (*sampled, *sampled))
+        self.by_user = {}
+        self.scheduled_by_doctor = {}
+        for appt_id, patient_id, doctor_id, status in cur.fetchall():
+            self.by_user.setdefault(patient_id, []).append(appt_id)
+            self.by_user.setdefault(doctor_id, []).append(appt_id)
+            if status == "scheduled":
+                self.scheduled_by_doctor.setdefault(doctor_id, []).append(appt_id)
+        cur.close()
+        self.tokens = {}
+
+    def login_all(self, client):
+        for uid, email, _ in self.doctors + self.patients:
+            status, body = client.request("POST", f"{API}/login",
+                                          {"email": email, "password": seeding.BENCH_PASSWORD})
+            if status != 200:
+                raise RuntimeError(f"No se pudo iniciar sesión como {email}: {status} {body[:200]!r}")
+            self.tokens[uid] = json.loads(body)["token"]
+
+    def auth(self, uid):
+        return {"Authorization": f"Bearer {self.tokens[uid]}"}
+
+
+def build_scenarios(pop: Population):
+    """Nombre -> función(rnd) que devuelve (method, path, body, headers)."""
+    slot_counter = itertools.count()
+    slot_lock = threading.Lock()
+    base_date = (datetime.now() + timedelta(days=400)).replace(minute=0, second=0, microsecond=0)
+    users_with_appts = [u for u in pop.doctors + pop.patients if pop.by_user.get(u[0])]
+    doctors_with_scheduled = [u for u in pop.doctors if pop.scheduled_by_doctor.get(u[0])]
+
+    def login(rnd):
+        return "POST", f"{API}/login", {"email": rnd.choice(pop.all_emails),
+                                        "password": seeding.BENCH_PASSWORD}, None
+
+    def doctors(rnd):
+        return "GET", f"{API}/doctors", None, None
+
+    def history(rnd):
+        uid = rnd.choice(pop.doctors + pop.patients)[0]
+        return "GET", f"{API}/appointments/history", None, pop.auth(uid)
+
+    def summary(rnd):
+        uid = rnd.choice(users_with_appts)[0]
+        appt = rnd.choice(pop.by_user[uid])
+        return "GET", f"{API}/appointments/{appt}/summary", None, pop.auth(uid)
+
+    def appointments(rnd):
+        # Cada cita en una franja distinta para no chocar con citas existentes
+        with slot_lock:
+            n = next(slot_counter)
+        when = base_date + timedelta(minutes=30 * n)
+        uid = rnd.choice(pop.patients)[0]
+        body = {"doctor_id": rnd.choice(pop.doctor_ids),
+                "appointment_date": when.strftime("%Y-%m-%dT%H:%M"), "reason": "Benchmark"}
+        return "POST", f"{API}/appointments", body, pop.auth(uid)
+
+    def complete(rnd):
+        uid = rnd.choice(doctors_with_scheduled)[0]
+        appt = rnd.choice(pop.scheduled_by_doctor[uid])
+        body = {
+            "notes": "Evolución favorable.",
+            "prescriptions": [{"medication_name": rnd.choice(seeding.MEDICATIONS), "dose": "500 mg",
+                               "frequency": "cada 8 horas"} for _ in range(rnd.randint(1, 10))],
+            "orders": [{"type": "lab", "name": rnd.choice(seeding.ORDERS["lab"]), "priority": "normal"}
+                       for _ in range(rnd.randint(0, 10))],
+        }
+        return "POST", f"{API}/appointments/{appt}/complete", body, pop.auth(uid)
+
+    scenarios = {"login": login, "doctors": doctors, "history": history, "summary": summary,
+                 "appointments": appointments, "complete": complete}
+    if not users_with_appts:
+        scenarios.pop("summary")
+    if not doctors_with_scheduled:
+        scenarios.pop("complete")
+    return scenarios
+
+
+# ---------- carga ----------
+def run_phase(port, make_request, concurrency, duration, warmup, seed_value):
+    """Corre `concurrency` hilos durante warmup+duration; mide solo después del warmup."""
+    start = time.monotonic()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+    latencies, statuses, errors = [], {}, []
+    lock = threading.Lock()
+
+    def worker(i):
+        rnd = random.Random(seed_value + i)
+        client = Client(port)
+        local_lat, local_status, local_err = [], {}, 0
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                break
+            method, path, body, headers = make_request(rnd)
+            t0 = time.perf_counter()
+            try:
+                status, _ = client.request(method, path, body, headers)
+            except Exception:
+                status = "error"
+            elapsed = (time.perf_counter() - t0) * 1000.0
+            if now >= measure_from:
+                local_lat.append(elapsed)
+                local_status[str(status)] = local_status.get(str(status), 0) + 1
+                if status == "error" or status >= 400:
+                    local_err += 1
+        with lock:
+            latencies.extend(local_lat)
+            for k, v in local_status.items():
+                statuses[k] = statuses.get(k, 0) + v
+            errors.append(local_err)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    pct = lambda p: round(percentile(latencies, p), 3) if latencies else None
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors),
+        "status_counts": statuses,
+        "throughput_rps": round(len(latencies) / duration, 2),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else None,
+            "p50": pct(50),
+            "p95": pct(95),
+            "p99": pct(99),
+            "max": pct(100),
+        },
+    }
+
+def connection_health(port):
+    """
+    Lee /api/metrics al final de la corrida: conexiones no devueltas (leaks),
+    retenidas de más y todavía prestadas. Con varios workers refleja solo al que responde.
+    """
+    status, data = Client(port).request("GET", "/api/metrics")
+    health = {"leaks": 0, "held_too_long": 0, "in_use_after": 0}
+    if status != 200:
+        return health
+    for line in data.decode("utf-8").splitlines():
+        if line.startswith("#") or " " not in line:
+            continue
+        name, value = line.rsplit(" ", 1)
+        if name.startswith("db_connection_leaks_total"):
+            health["leaks"] += int(float(value))
+        elif name.startswith("db_connections_held_too_long_total"):
+            health["held_too_long"] += int(float(value))
+        elif name.startswith("db_pool_connections") and 'state="in_use"' in name:
+            health["in_use_after"] += int(float(value))
+    return health
+
+def print_report(results):
+    print(f"\n{'endpoint':<14}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errores':>10}")
+    for name, r in results["endpoints"].items():
+        lat = r["latency_ms"]
+        fmt = lambda v: f"{v:10.2f}" if v is not None else f"{'-':>10}"
+        print(f"{name:<14}{r['throughput_rps']:>10.1f}{fmt(lat['p50'])}{fmt(lat['p95'])}{fmt(lat['p99'])}{r['errors']:>10}")
+    conns = results.get("connections")
+    if conns:
+        print(f"\nconexiones: {conns['leaks']} no devueltas, {conns['held_too_long']} retenidas de más, "
+              f"{conns['in_use_after']} prestadas al terminar")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark por endpoint de la API")
+    parser.add_argument("--local-mysql", action="store_true",
+                        help="levanta un mysqld/mariadbd desechable en lugar de usar DB_*")
+    parser.add_argument("--database", default="app_medica_bench")
+    parser.add_argument("--skip-seed", action="store_true", help="reutiliza una base ya sembrada")
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--appointments", type=int, default=50000)
+    parser.add_argument("--sample-users", type=int, default=20, help="usuarios con sesión que generan la carga")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="segundos medidos por endpoint")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--workers", type=int, default=1, help="workers de uvicorn")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="archivo JSON de resultados (por defecto bench/results/<fecha>.json)")
+    args = parser.parse_args()
+
+    selected = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = set(selected) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"endpoints desconocidos: {', '.join(sorted(unknown))}")
+
+    local = LocalMySQL().start() if args.local_mysql else None
+    server = None
+    try:
+        if local:
+            env = local.env(args.database)
+        else:
+            from backend import database  # carga el .env
+            env = {"DB_HOST": database.DB_HOST, "DB_PORT": str(database.DB_PORT),
+                   "DB_USER": database.DB_USER, "DB_PASSWORD": database.DB_PASSWORD,
+                   "DB_NAME": args.database}
+        env["AUTH_SECRET"] = os.getenv("AUTH_SECRET") or "bench-secret"
+
+        cnx = seeding.connect(env)
+        population_info = None
+        if not args.skip_seed:
+            print("Sembrando base de datos...")
+            seeding.create_schema(cnx, args.database)
+            population_info = seeding.seed(cnx, args.doctors, args.patients, args.appointments, args.seed)
+            print(population_info)
+        cnx.database = args.database
+        rnd = random.Random(args.seed)
+        pop = Population(cnx, args.sample_users, rnd)
+        cnx.close()
+
+        server, port = start_server(env, args.workers)
+        pop.login_all(Client(port))
+        scenarios = build_scenarios(pop)
+
+        results = {
+            "meta": {
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "git_rev": _git_rev(),
+                "concurrency": args.concurrency,
+                "duration_s": args.duration,
+                "warmup_s": args.warmup,
+                "uvicorn_workers": args.workers,
+                "population": population_info,
+            },
+            "endpoints": {},
+        }
+        for i, name in enumerate(selected):
+            if name not in scenarios:
+                print(f"{name}: sin datos para generar carga, se omite")
+                continue
+            print(f"Midiendo {name}...")
+            results["endpoints"][name] = run_phase(port, scenarios[name], args.concurrency,
+                                                   args.duration, args.warmup, args.seed + 1000 * i)
+        results["connections"] = connection_health(port)
+    finally:
+        if server:
+            stop_server(server)
+        if local:
+            local.stop()
+
+    out = args.out or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print_report(results)
+    print(f"\nResultados guardados en {out}")
+    if results.get("connections", {}).get("leaks"):
+        print("ERROR: hubo conexiones a MySQL sin devolver (ver el log 'backend.sql' del servidor)")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
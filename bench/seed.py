@@ -0,0 +1,144 @@
+# bench/seed.py
+# --------------------------------------------
+# Población sintética para benchmarks: doctores, pacientes y citas
+# --------------------------------------------
+# Uso: python -m bench.seed --doctors 50 --patients 2000 --appointments 50000
+# (toma el servidor de las variables DB_* del entorno / .env; la base --database
+# se borra y se vuelve a crear, por eso no usa DB_NAME). Al final se recalculan
+# las tablas de estadísticas, que leen GET /doctors/{id}/stats y el autocompletado.
+import argparse
+import os
+import random
+import re
+from datetime import datetime, timedelta
+
+import mysql.connector
+
+from backend.doctor_stats import rebuild as rebuild_doctor_stats
+from backend.security import hash_password
+
+BENCH_PASSWORD = "bench-password"
+SCHEMA_FILE = os.path.join(os.path.dirname(__file__), "..", "db", "init.sql")
+BATCH = 2000
+
+SPECIALTIES = ["Medicina general", "Cardiología", "Dermatología", "Pediatría",
+               "Ginecología", "Ortopedia", "Neurología", "Psiquiatría"]
+MEDICATIONS = ["Acetaminofén", "Ibuprofeno", "Amoxicilina", "Losartán", "Metformina",
+               "Omeprazol", "Atorvastatina", "Salbutamol", "Loratadina", "Enalapril"]
+ORDERS = {
+    "lab": ["Hemograma", "Glicemia", "Perfil lipídico", "Uroanálisis", "Creatinina"],
+    "imaging": ["Rayos X de tórax", "Ecografía abdominal", "Resonancia de rodilla"],
+    "procedure": ["Electrocardiograma", "Espirometría"],
+    "referral": ["Remisión a nutrición", "Remisión a fisioterapia"],
+}
+REASONS = ["Control", "Dolor de cabeza", "Chequeo anual", "Dolor abdominal",
+           "Tos persistente", "Revisión de exámenes", "Fiebre", "Dolor lumbar"]
+
+
+def user_email(role: str, n: int) -> str:
+    return f"{role}{n}@bench.medigo"
+
+def create_schema(cnx, db_name: str):
+    """Crea la base (desde cero) con db/init.sql, ignorando su CREATE DATABASE/USE."""
+    cur = cnx.cursor()
+    cur.execute(f"DROP DATABASE IF EXISTS {db_name}")
+    cur.execute(f"CREATE DATABASE {db_name}")
+    cur.execute(f"USE {db_name}")
+    with open(SCHEMA_FILE, "r", encoding="utf-8") as f:
+        sql = re.sub(r"--[^\n]*", "", f.read())
+    for stmt in (s.strip() for s in sql.split(";")):
+        if not stmt or re.match(r"(CREATE DATABASE|USE)\b", stmt, re.IGNORECASE):
+            continue
+        cur.execute(stmt)
+    cnx.commit()
+    cur.close()
+
+def _insert_batches(cur, sql, rows):
+    for i in range(0, len(rows), BATCH):
+        cur.executemany(sql, rows[i:i + BATCH])
+
+def seed(cnx, doctors: int, patients: int, appointments: int, seed_value: int = 42):
+    rnd = random.Random(seed_value)
+    cur = cnx.cursor()
+    # Un solo hash (con el costo configurado) para todos: el login mide bcrypt real
+    pwd_hash = hash_password(BENCH_PASSWORD)
+
+    users = [(f"Doctor {n}", user_email("doctor", n), pwd_hash, "doctor", rnd.choice(SPECIALTIES))
+             for n in range(doctors)]
+    users += [(f"Paciente {n}", user_email("patient", n), pwd_hash, "patient", None)
+              for n in range(patients)]
+    _insert_batches(cur, "INSERT INTO users (full_name, email, password_hash, role, specialty) "
+                         "VALUES (%s,%s,%s,%s,%s)", users)
+    cur.execute("SELECT id, role FROM users")
+    ids = {"doctor": [], "patient": []}
+    for uid, role in cur.fetchall():
+        ids[role].append(uid)
+    cnx.commit()
+
+    # Citas: 3 años hacia atrás y 2 meses hacia adelante, en franjas de 30 min
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    start = now - timedelta(days=3 * 365)
+    span_slots = (3 * 365 + 60) * 48
+    rows = []
+    for _ in range(appointments):
+        when = start + timedelta(minutes=30 * rnd.randrange(span_slots))
+        if when > now:
+            status = "scheduled" if rnd.random() < 0.9 else "cancelled"
+        else:
+            status = rnd.choices(["completed", "cancelled", "scheduled"], [0.8, 0.15, 0.05])[0]
+        rows.append((rnd.choice(ids["patient"]), rnd.choice(ids["doctor"]), when, rnd.choice(REASONS), status))
+    _insert_batches(cur, "INSERT INTO appointments (patient_id, doctor_id, appointment_date, reason, status) "
+                         "VALUES (%s,%s,%s,%s,%s)", rows)
+    cnx.commit()
+
+    # Nota, prescripciones y órdenes para las citas completadas
+    cur.execute("SELECT id, appointment_date FROM appointments WHERE status='completed'")
+    notes, prescriptions, orders = [], [], []
+    for appt_id, when in cur.fetchall():
+        notes.append((appt_id, f"Paciente evaluado por {rnd.choice(REASONS).lower()}."))
+        for _ in range(rnd.randint(0, 3)):
+            prescriptions.append((appt_id, rnd.choice(MEDICATIONS), "500 mg", "oral", "cada 8 horas",
+                                  "7 días", "21", "Tomar después de las comidas"))
+        for _ in range(rnd.randint(0, 2)):
+            kind = rnd.choice(list(ORDERS))
+            orders.append((appt_id, kind, rnd.choice(ORDERS[kind]),
+                           rnd.choice(["normal", "prioritary", "urgent"]), None, when + timedelta(days=7)))
+    _insert_batches(cur, "INSERT INTO consult_notes (appointment_id, note) VALUES (%s,%s)", notes)
+    _insert_batches(cur, "INSERT INTO prescriptions (appointment_id, medication_name, dose, route, frequency, "
+                         "duration, quantity, instructions) VALUES (%s,%s,%s,%s,%s,%s,%s,%s)", prescriptions)
+    _insert_batches(cur, "INSERT INTO orders (appointment_id, type, name, priority, notes, scheduled_date) "
+                         "VALUES (%s,%s,%s,%s,%s,%s)", orders)
+    cnx.commit()
+    cur.close()
+
+    # Las inserciones de arriba no pasan por StatsDelta: llenar las tablas resumen
+    rebuild_doctor_stats(cnx)
+    return {"doctors": doctors, "patients": patients, "appointments": appointments,
+            "notes": len(notes), "prescriptions": len(prescriptions), "orders": len(orders)}
+
+def connect(env, database=None):
+    return mysql.connector.connect(
+        host=env["DB_HOST"], port=int(env["DB_PORT"]), user=env["DB_USER"],
+        password=env["DB_PASSWORD"], database=database,
+    )
+
+def main():
+    from backend import database  # carga el .env
+
+    parser = argparse.ArgumentParser(description="Crea y llena una base de datos para benchmarks")
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--appointments", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database", default="app_medica_bench", help="base a (re)crear")
+    args = parser.parse_args()
+
+    env = {"DB_HOST": database.DB_HOST, "DB_PORT": database.DB_PORT, "DB_USER": database.DB_USER,
+           "DB_PASSWORD": database.DB_PASSWORD}
+    cnx = connect(env)
+    create_schema(cnx, args.database)
+    print(seed(cnx, args.doctors, args.patients, args.appointments, args.seed))
+    cnx.close()
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,8 @@ CREATE TABLE IF NOT EXISTS users (
     full_name VARCHAR(100) NOT NULL,
     email VARCHAR(100) NOT NULL UNIQUE,
     password_hash VARCHAR(255) NOT NULL, -- Se guarda el hash, no la contraseña plana
-    role ENUM('patient', 'doctor') NOT NULL
+    role ENUM('patient', 'doctor') NOT NULL,
+    specialty VARCHAR(100) NULL -- solo doctores, es la columna que leen/escriben los routers
 );
 
 -- 2. Tabla de Doctores (doctors)
@@ -31,6 +32,11 @@ CREATE TABLE IF NOT EXISTS appointments (
     reason TEXT,
     status ENUM('scheduled', 'completed', 'cancelled') DEFAULT 'scheduled',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Historial paginado por (appointment_date, id) para cada paciente/doctor
+    INDEX idx_appointments_patient_date (patient_id, appointment_date, id),
+    INDEX idx_appointments_doctor_date (doctor_id, appointment_date, id),
+    -- Lotes del archivo: citas cerradas más antiguas primero, por estado
+    INDEX idx_appointments_status_date (status, appointment_date, id),
     FOREIGN KEY (patient_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (doctor_id) REFERENCES users(id) ON DELETE CASCADE
 );
@@ -46,6 +52,7 @@ CREATE TABLE IF NOT EXISTS prescriptions (
   quantity VARCHAR(40) NULL,
   instructions TEXT NULL,
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  FULLTEXT INDEX ft_prescriptions_text (medication_name, instructions), -- GET /search
   FOREIGN KEY (appointment_id) REFERENCES appointments(id) ON DELETE CASCADE
 );
 
@@ -58,6 +65,8 @@ CREATE TABLE IF NOT EXISTS orders (
   notes TEXT NULL,
   scheduled_date DATETIME NULL,
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  FULLTEXT INDEX ft_orders_name (name), -- GET /search
+  INDEX idx_orders_type_name (type, name), -- nombres usados para el autocompletado
   FOREIGN KEY (appointment_id) REFERENCES appointments(id) ON DELETE CASCADE
 );
 
@@ -66,6 +75,142 @@ CREATE TABLE IF NOT EXISTS consult_notes (
   appointment_id INT NOT NULL,
   note TEXT NOT NULL,
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  FULLTEXT INDEX ft_consult_notes_note (note), -- GET /search
   FOREIGN KEY (appointment_id) REFERENCES appointments(id) ON DELETE CASCADE
 );
 
+
+-- Claves Idempotency-Key ya procesadas (POST /appointments y /complete).
+-- La PK garantiza que una misma clave se ejecute a lo sumo una vez por usuario.
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+  user_id INT NOT NULL,
+  idem_key VARCHAR(100) NOT NULL,
+  endpoint VARCHAR(120) NOT NULL,
+  request_hash CHAR(64) NOT NULL,
+  status_code SMALLINT NOT NULL,
+  response_body TEXT NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (user_id, idem_key),
+  INDEX idx_idempotency_created (created_at)
+);
+
+-- Archivo de citas cerradas (lo llena scripts/archive_appointments.py).
+-- Mismas columnas que las tablas vivas, sin FKs y con los mismos ids.
+-- appointments_archive va particionada por año: las consultas por rango de
+-- fechas del historial solo leen las particiones que tocan.
+CREATE TABLE IF NOT EXISTS appointments_archive (
+  id INT NOT NULL,
+  patient_id INT NOT NULL,
+  doctor_id INT NOT NULL,
+  appointment_date DATETIME NOT NULL,
+  reason TEXT,
+  status ENUM('scheduled', 'completed', 'cancelled') NOT NULL,
+  created_at TIMESTAMP NULL,
+  PRIMARY KEY (id, appointment_date),
+  INDEX idx_appointments_archive_patient_date (patient_id, appointment_date, id),
+  INDEX idx_appointments_archive_doctor_date (doctor_id, appointment_date, id)
+)
+PARTITION BY RANGE (YEAR(appointment_date)) (
+  PARTITION p_old VALUES LESS THAN (2020),
+  PARTITION p2020 VALUES LESS THAN (2021),
+  PARTITION p2021 VALUES LESS THAN (2022),
+  PARTITION p2022 VALUES LESS THAN (2023),
+  PARTITION p2023 VALUES LESS THAN (2024),
+  PARTITION p2024 VALUES LESS THAN (2025),
+  PARTITION p2025 VALUES LESS THAN (2026),
+  PARTITION p2026 VALUES LESS THAN (2027),
+  PARTITION p_max VALUES LESS THAN MAXVALUE
+);
+
+CREATE TABLE IF NOT EXISTS prescriptions_archive (
+  id INT PRIMARY KEY,
+  appointment_id INT NOT NULL,
+  medication_name VARCHAR(120) NOT NULL,
+  dose VARCHAR(80) NULL,
+  route VARCHAR(40) NULL,
+  frequency VARCHAR(60) NULL,
+  duration VARCHAR(60) NULL,
+  quantity VARCHAR(40) NULL,
+  instructions TEXT NULL,
+  created_at TIMESTAMP NULL,
+  INDEX idx_prescriptions_archive_appointment (appointment_id),
+  FULLTEXT INDEX ft_prescriptions_archive_text (medication_name, instructions)
+);
+
+CREATE TABLE IF NOT EXISTS orders_archive (
+  id INT PRIMARY KEY,
+  appointment_id INT NOT NULL,
+  type ENUM('lab','imaging','procedure','referral') NOT NULL,
+  name VARCHAR(140) NOT NULL,
+  priority ENUM('normal','prioritary','urgent') DEFAULT 'normal',
+  notes TEXT NULL,
+  scheduled_date DATETIME NULL,
+  created_at TIMESTAMP NULL,
+  INDEX idx_orders_archive_appointment (appointment_id),
+  FULLTEXT INDEX ft_orders_archive_name (name)
+);
+
+CREATE TABLE IF NOT EXISTS consult_notes_archive (
+  id INT PRIMARY KEY,
+  appointment_id INT NOT NULL,
+  note TEXT NOT NULL,
+  created_at TIMESTAMP NULL,
+  INDEX idx_consult_notes_archive_appointment (appointment_id),
+  FULLTEXT INDEX ft_consult_notes_archive_note (note)
+);
+
+-- Marca del archivo: ninguna cita con appointment_date >= archived_before está archivada
+CREATE TABLE IF NOT EXISTS archive_state (
+  id TINYINT PRIMARY KEY,
+  archived_before DATETIME NOT NULL
+);
+
+-- Opcional: particionar también la tabla viva por fecha (MySQL no admite FKs en
+-- tablas particionadas, así que primero hay que quitar las que apuntan a
+-- appointments y las suyas hacia users). Conviene si no se archiva y la tabla es muy grande.
+-- ALTER TABLE prescriptions DROP FOREIGN KEY prescriptions_ibfk_1;
+-- ALTER TABLE orders DROP FOREIGN KEY orders_ibfk_1;
+-- ALTER TABLE consult_notes DROP FOREIGN KEY consult_notes_ibfk_1;
+-- ALTER TABLE appointments
+--   DROP FOREIGN KEY appointments_ibfk_1,
+--   DROP FOREIGN KEY appointments_ibfk_2,
+--   DROP PRIMARY KEY,
+--   ADD PRIMARY KEY (id, appointment_date)
+--   PARTITION BY RANGE (YEAR(appointment_date)) (
+--     PARTITION p_old VALUES LESS THAN (2024),
+--     PARTITION p2024 VALUES LESS THAN (2025),
+--     PARTITION p2025 VALUES LESS THAN (2026),
+--     PARTITION p2026 VALUES LESS THAN (2027),
+--     PARTITION p_max VALUES LESS THAN MAXVALUE
+--   );
+-- Cada año: ALTER TABLE appointments REORGANIZE PARTITION p_max INTO
+--   (PARTITION p2027 VALUES LESS THAN (2028), PARTITION p_max VALUES LESS THAN MAXVALUE);
+
+-- Estadísticas por doctor (GET /doctors/{id}/stats). Se actualizan en la misma
+-- transacción que crea/cancela/completa la cita; scripts/rebuild_doctor_stats.py las recalcula.
+CREATE TABLE IF NOT EXISTS doctor_daily_stats (
+  doctor_id INT NOT NULL,
+  day DATE NOT NULL,
+  scheduled INT NOT NULL DEFAULT 0,
+  completed INT NOT NULL DEFAULT 0,
+  cancelled INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (doctor_id, day)
+);
+
+-- Órdenes y medicamentos también por día de la cita: el rango pedido se aplica a todo
+CREATE TABLE IF NOT EXISTS doctor_order_stats (
+  doctor_id INT NOT NULL,
+  day DATE NOT NULL,
+  type ENUM('lab','imaging','procedure','referral') NOT NULL,
+  priority ENUM('normal','prioritary','urgent') NOT NULL,
+  total INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (doctor_id, day, type, priority)
+);
+
+CREATE TABLE IF NOT EXISTS doctor_medication_stats (
+  doctor_id INT NOT NULL,
+  day DATE NOT NULL,
+  medication_name VARCHAR(120) NOT NULL,
+  total INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (doctor_id, day, medication_name)
+);
@@ -0,0 +1,35 @@
+import argparse
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Permite ejecutar "python scripts/archive_appointments.py" desde la raíz del proyecto
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.database import db_connection
+from backend.archive import archive_closed, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+
+def main():
+    parser = argparse.ArgumentParser(description="Mueve las citas cerradas antiguas a las tablas de archivo")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help="archiva citas completadas/canceladas con más de N días")
+    parser.add_argument("--before", help="fecha límite YYYY-MM-DD (en lugar de --days)")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="citas por transacción")
+    parser.add_argument("--sleep", type=float, default=0.0, help="segundos de pausa entre lotes")
+    args = parser.parse_args()
+
+    if args.before:
+        cutoff = datetime.strptime(args.before, "%Y-%m-%d")
+    else:
+        cutoff = datetime.combine(datetime.now().date() - timedelta(days=args.days), datetime.min.time())
+    if args.batch_size < 1:
+        parser.error("--batch-size debe ser mayor que 0")
+
+    print(f"Archivando citas cerradas anteriores a {cutoff:%Y-%m-%d}...")
+    with db_connection() as conn:
+        total = archive_closed(conn, cutoff, args.batch_size, args.sleep,
+                               progress=lambda n: print(f"  {n} citas archivadas"))
+    print(f"✅ Archivadas: {total}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import argparse
+import sys
+from pathlib import Path
+
+# Permite ejecutar "python scripts/import_data.py" desde la raíz del proyecto
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.database import db_connection
+from backend.bulk_import import import_stream, IMPORT_CHUNK_SIZE
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa citas históricas desde NDJSON o CSV")
+    parser.add_argument("file", help="archivo .ndjson/.jsonl o .csv ('-' para stdin)")
+    parser.add_argument("--format", choices=["ndjson", "csv"], help="por defecto, según la extensión")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="filas por transacción")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.file.lower().endswith(".csv") else "ndjson")
+    source = sys.stdin if args.file == "-" else open(args.file, "r", encoding="utf-8-sig", newline="")
+    try:
+        with db_connection() as conn:
+            report = import_stream(conn, source, fmt, args.chunk_size)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+    print(f"Procesadas: {report['processed']}  Importadas: {report['imported']}  Fallidas: {report['failed']}")
+    for err in report["errors"]:
+        print(f"  línea {err['line']}: {err['error']}")
+    if report["errors_truncated"]:
+        print("  (hay más errores de los que se muestran)")
+    sys.exit(1 if report["failed"] else 0)
+
+if __name__ == "__main__":
+    main()
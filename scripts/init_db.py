@@ -1,4 +1,5 @@
 import os
+import re
 from dotenv import load_dotenv
 import mysql.connector
 
@@ -14,7 +15,9 @@ DB_NAME = os.getenv("DB_NAME", "app_medica")
 def run_sql_file(cursor, path):
     with open(path, "r", encoding="utf-8") as f:
         sql_script = f.read()
-    # separa por ';' cuidando vacíos
+    # quita los comentarios "--" (de línea completa o al final de una línea: pueden
+    # traer ';' o SQL opcional) y separa por ';' cuidando vacíos
+    sql_script = re.sub(r"--[^\n]*", "", sql_script)
     statements = [s.strip() for s in sql_script.split(";") if s.strip()]
     for stmt in statements:
         cursor.execute(stmt)
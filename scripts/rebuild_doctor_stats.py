@@ -0,0 +1,24 @@
+import argparse
+import sys
+from pathlib import Path
+
+# Permite ejecutar "python scripts/rebuild_doctor_stats.py" desde la raíz del proyecto
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.database import db_connection
+from backend.doctor_stats import rebuild
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recalcula las estadísticas por doctor desde las citas (incluye las archivadas)")
+    parser.add_argument("--doctor-id", type=int, help="solo este doctor (por defecto, todos)")
+    args = parser.parse_args()
+
+    who = f"doctor {args.doctor_id}" if args.doctor_id is not None else "todos los doctores"
+    print(f"Recalculando estadísticas de {who}...")
+    with db_connection() as conn:
+        rebuild(conn, args.doctor_id)
+    print("✅ Estadísticas reconstruidas.")
+
+if __name__ == "__main__":
+    main()